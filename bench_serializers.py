@@ -0,0 +1,59 @@
+"""
+Compare encode/decode time and on-disk size of the available serializers
+on a synthetic level_data.json.
+
+Usage: python bench_serializers.py [--users 100000] [--rounds 5]
+"""
+import argparse
+import datetime
+import random
+import time
+
+from main import Serializer
+
+
+def make_level_data(users):
+    rng = random.Random(1234)
+    base_id = 1100000000000000000
+    now = datetime.datetime.now()
+    data = {}
+    for i in range(users):
+        level = rng.randint(1, 50)
+        echo_time = (now + datetime.timedelta(days=rng.randint(0, 30))).isoformat() if level == 50 else None
+        data[str(base_id + i * 7919)] = {"xp": rng.randint(0, 5000), "level": level, "echo_time": echo_time}
+    return data
+
+
+def best_time(func, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--rounds', type=int, default=5)
+    args = parser.parse_args()
+
+    data = make_level_data(args.users)
+    print(f"Synthetic level_data.json with {args.users} users, best of {args.rounds} rounds")
+    print(f"{'backend':<10} {'format':<8} {'size (KiB)':>11} {'encode (ms)':>12} {'decode (ms)':>12}")
+
+    for backend in Serializer.available():
+        for pretty in (False, True):
+            serializer = Serializer(backend, pretty)
+            payload = serializer.dumps(data)
+            assert serializer.loads(payload) == data
+            encode = best_time(lambda: serializer.dumps(data), args.rounds)
+            decode = best_time(lambda: serializer.loads(payload), args.rounds)
+            print(f"{backend:<10} {'pretty' if pretty else 'compact':<8} {len(payload) / 1024:>11.1f} "
+                  f"{encode * 1000:>12.1f} {decode * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
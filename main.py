@@ -7,9 +7,28 @@ import aiohttp
 import datetime
 import os
 from typing import Optional
-import mcstatus  
+try:
+    import mcstatus
+except ImportError:
+    mcstatus = None
 import io
+import gzip
+import html
+import random
+import bisect
+import heapq
+import itertools
+import time
 import threading
+import sqlite3
+import functools
+import tempfile
+import concurrent.futures
+import contextlib
+import array
+import struct
+import sys
+import urllib.parse
 
 
 TOKEN = 'BOT_TOKEN' 
@@ -31,7 +50,37 @@ STAFF_REPORTS_CHANNEL_ID = 1389767774280351864
 intents = discord.Intents.default()
 intents.message_content = True
 intents.members = True
-bot = commands.Bot(command_prefix='!', intents=intents)
+
+class EchoBot(commands.Bot):
+    async def setup_hook(self):
+        await run_io(state_store.load_all)
+        await storage.open()
+        await afk_registry.load()
+        mojang_profiles.load()
+        await run_io(close_jobs.open)
+        await run_io(player_history.load)
+        flush_state_store.start()
+        compact_storage.start()
+        flush_xp.start()
+        flush_log_sink.start()
+        flush_player_history.start()
+        log_diagnostics.start()
+        dm_dispatcher.start()
+        close_jobs.start()
+
+    async def close(self):
+        await close_jobs.stop()
+        await dm_dispatcher.stop()
+        await log_sink.flush()
+        await super().close()
+        await http_client.close()
+        await xp_accumulator.flush()
+        await player_history.flush()
+        await state_store.flush_async()
+        await storage.close()
+        persistence_executor.shutdown(wait=True)
+
+bot = EchoBot(command_prefix='!', intents=intents)
 
 def is_council():
     """
@@ -90,64 +139,1148 @@ DISCUSSION_CHANNEL_ID = 1382337513259270208
 CHAT_CHANNEL_ID = 1351291663074725899
 
 AFK_DATA_FILE = 'afk_data.json'
+STATE_FLUSH_INTERVAL = 10
+PERSISTENCE_WORKERS = 4
+SERIALIZER_BACKEND = None  # None picks the fastest installed of 'orjson', 'msgspec', 'json'
+SERIALIZER_PRETTY = False  # indent data files for debugging
 
-def load_data():
+class Serializer:
+    """
+    Encodes and decodes the bot's data files.
+    Output is compact unless pretty is set; orjson or msgspec are used when installed,
+    otherwise the stdlib json module.
+    """
+    BACKENDS = ('orjson', 'msgspec', 'json')
+
+    def __init__(self, backend=None, pretty=False):
+        self.backend = backend or self.available()[0]
+        self.pretty = pretty
+        self.decode_errors = (ValueError,)
+        if self.backend == 'orjson':
+            import orjson
+            self.module = orjson
+        elif self.backend == 'msgspec':
+            import msgspec
+            self.module = msgspec
+            self.encoder = msgspec.json.Encoder()
+            self.decode_errors = (ValueError, msgspec.DecodeError)
+        else:
+            self.module = json
+
+    @classmethod
+    def available(cls):
+        names = []
+        for name in cls.BACKENDS:
+            try:
+                __import__(name)
+                names.append(name)
+            except ImportError:
+                pass
+        return names
+
+    def dumps(self, obj, pretty=None):
+        pretty = self.pretty if pretty is None else pretty
+        if self.backend == 'orjson':
+            return self.module.dumps(obj, option=self.module.OPT_INDENT_2 if pretty else 0)
+        if self.backend == 'msgspec':
+            data = self.encoder.encode(obj)
+            return self.module.json.format(data, indent=2) if pretty else data
+        if pretty:
+            return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+        return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+    def loads(self, data):
+        if self.backend == 'orjson':
+            return self.module.loads(data)
+        if self.backend == 'msgspec':
+            return self.module.json.decode(data)
+        return json.loads(data)
+
+serializer = Serializer(SERIALIZER_BACKEND, SERIALIZER_PRETTY)
+
+persistence_executor = concurrent.futures.ThreadPoolExecutor(max_workers=PERSISTENCE_WORKERS, thread_name_prefix='persistence')
+storage_locks = {}
+DIAGNOSTICS = {}  # component name -> stats() callable, shown by /diagnostics and logged periodically
+DIAGNOSTICS_LOG_INTERVAL = 15  # minutes
+DIAGNOSTICS_FIELD_CHARS = 750  # per component field
+DIAGNOSTICS_EMBED_CHARS = 5500  # per /diagnostics message, under Discord's 6000 character embed limit
+
+def storage_lock(name):
+    """
+    Return the asyncio lock that serializes writers of one store.
+    Hold it across any read-modify-write sequence that awaits in between.
+    """
+    lock = storage_locks.get(name)
+    if lock is None:
+        lock = storage_locks[name] = asyncio.Lock()
+    return lock
+
+async def run_io(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(persistence_executor, functools.partial(func, *args))
+
+def atomic_write(path, payload):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=os.path.basename(path) + '.', suffix='.tmp')
     try:
-        with open(DATA_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {
-            'tickets': {},
-            'closed_tickets': {}
-        }
+        with os.fdopen(fd, 'wb') as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class StateStore:
+    """
+    Process-wide in-memory copy of the bot's JSON data files.
+    Each file is read once, load_*/save_* helpers are served from memory,
+    and files marked dirty are written back atomically by flush_async() in the persistence pool.
+    """
+    def __init__(self):
+        self.documents = {}
+        self.defaults = {}
+        self.dirty = set()
+
+    def register(self, path, default_factory):
+        self.defaults[path] = default_factory
+
+    def load_all(self):
+        for path in self.defaults:
+            self.get(path)
+
+    def get(self, path):
+        if path not in self.documents:
+            self.documents[path] = self._read(path)
+        return self.documents[path]
+
+    def set(self, path, data):
+        self.documents[path] = data
+        self.dirty.add(path)
+
+    def mark_dirty(self, path):
+        self.dirty.add(path)
+
+    def _read(self, path):
+        try:
+            with open(path, 'rb') as f:
+                content = f.read().strip()
+            if content:
+                return serializer.loads(content)
+        except FileNotFoundError:
+            pass
+        except serializer.decode_errors as e:
+            print(f"Error reading {path}, using defaults: {e}")
+            return self.defaults[path]()
+        self.dirty.add(path)
+        return self.defaults[path]()
+
+    def _snapshot(self, path):
+        return serializer.dumps(self.documents[path])
+
+    def flush(self):
+        for path in list(self.dirty):
+            self.dirty.discard(path)
+            try:
+                atomic_write(path, self._snapshot(path))
+            except Exception as e:
+                self.dirty.add(path)
+                print(f"Error saving {path}: {e}")
+
+    async def flush_async(self):
+        for path in list(self.dirty):
+            async with storage_lock(path):
+                if path not in self.dirty:
+                    continue
+                self.dirty.discard(path)
+                try:
+                    await run_io(atomic_write, path, self._snapshot(path))
+                except Exception as e:
+                    self.dirty.add(path)
+                    print(f"Error saving {path}: {e}")
+
+state_store = StateStore()
+state_store.register(DATA_FILE, lambda: {'tickets': {}, 'closed_tickets': {}})
+state_store.register(REPORT_DATA_FILE, lambda: {'pending_reports': {}})
+state_store.register(TICKET_COUNTS_FILE, lambda: {'user_ticket_counts': {}})
+state_store.register(WARNINGS_FILE, lambda: {'warnings': {}})
+state_store.register(REPORT_COUNTS_FILE, lambda: {'user_report_counts': {}})
+
+@tasks.loop(seconds=STATE_FLUSH_INTERVAL)
+async def flush_state_store():
+    await state_store.flush_async()
+
+def load_data():
+    return state_store.get(DATA_FILE)
 
 def save_data(data):
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    state_store.set(DATA_FILE, data)
 
 def load_report_data():
-    try:
-        with open(REPORT_DATA_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {'pending_reports': {}}
+    return state_store.get(REPORT_DATA_FILE)
 
 def save_report_data(data):
-    with open(REPORT_DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
-
-def load_ticket_counts():
-    try:
-        with open(TICKET_COUNTS_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {'user_ticket_counts': {}}
-
-def save_ticket_counts(data):
-    with open(TICKET_COUNTS_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    state_store.set(REPORT_DATA_FILE, data)
 
 def load_warnings():
-    try:
-        with open(WARNINGS_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {'warnings': {}}
+    return state_store.get(WARNINGS_FILE)
 
 def save_warnings(data):
-    with open(WARNINGS_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    state_store.set(WARNINGS_FILE, data)
+
+STORAGE_BACKEND = 'json'  # 'json' or 'sqlite'
+SQLITE_DB_FILE = 'echo_data.db'
+
+# ticket_counts.json and report_counts.json are retired: they are read once, to seed the
+# counter log (or the SQLite import) when it has no snapshot yet, and never written after that.
+COUNTER_FILES = {
+    'tickets': (TICKET_COUNTS_FILE, 'user_ticket_counts'),
+    'reports': (REPORT_COUNTS_FILE, 'user_report_counts')
+}
+
+def is_expired(end_time, now):
+    return datetime.datetime.fromisoformat(end_time) <= now
+
+COUNTER_LOG_DIR = 'counter_log'
+COUNTER_LOG_SEGMENT_BYTES = 1024 * 1024
+STORAGE_COMPACT_INTERVAL = 30  # minutes
+
+class CounterLog:
+    """
+    Append-only, segmented log of ticket and report counter changes.
+    Aggregates live in memory and are rebuilt at startup from the last snapshot
+    plus every segment written after it. compact() folds the log into a new snapshot.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.snapshot_path = os.path.join(directory, 'snapshot.json')
+        self.counts = {kind: {} for kind in COUNTER_FILES}
+        self.segment = 1
+        self.handle = None
+
+    def _segment_path(self, number):
+        return os.path.join(self.directory, f"segment-{number:06d}.jsonl")
+
+    def _segment_numbers(self):
+        numbers = []
+        if not os.path.isdir(self.directory):
+            return numbers
+        for name in os.listdir(self.directory):
+            if name.startswith('segment-') and name.endswith('.jsonl'):
+                numbers.append(int(name[len('segment-'):-len('.jsonl')]))
+        return sorted(numbers)
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        self.counts, last_segment, corrupt = self.load()
+        if corrupt:
+            bad_path = f"{self.snapshot_path}.corrupt-{int(time.time())}"
+            os.replace(self.snapshot_path, bad_path)
+            print(f"Moved the unreadable counter snapshot to {bad_path}")
+        self.segment = last_segment + 1
+        self.compact()
+
+    def load(self):
+        """
+        Rebuild the aggregates from the snapshot and every later segment without writing anything.
+        Returns (counts, last segment number, whether the snapshot was unreadable).
+        """
+        corrupt = False
+        try:
+            with open(self.snapshot_path, 'rb') as f:
+                snapshot = serializer.loads(f.read())
+            counts = {kind: dict(snapshot['counts'].get(kind, {})) for kind in COUNTER_FILES}
+            snapshot_segment = int(snapshot['segment'])
+        except FileNotFoundError:
+            snapshot_segment, counts = 0, self._seed_counts()
+        except serializer.decode_errors + (KeyError, TypeError, AttributeError) as e:
+            print(f"Counter snapshot is unreadable ({e}); rebuilding counts from the retired "
+                  f"counter files and every remaining segment")
+            snapshot_segment, counts, corrupt = 0, self._seed_counts(), True
+        segments = [n for n in self._segment_numbers() if n > snapshot_segment]
+        for number in segments:
+            self._replay(number, counts)
+        return counts, max(segments + [snapshot_segment]), corrupt
+
+    def _seed_counts(self):
+        return {kind: dict(state_store.get(path)[key]) for kind, (path, key) in COUNTER_FILES.items()}
+
+    def _replay(self, number, aggregates):
+        with open(self._segment_path(number), 'rb') as f:
+            for line in f:
+                try:
+                    event = serializer.loads(line)
+                    counts = aggregates[event['k']]
+                    counts[event['u']] = counts.get(event['u'], 0) + event['d']
+                except serializer.decode_errors + (KeyError,) as e:
+                    print(f"Skipping bad counter log entry in segment {number}: {e}")
+
+    async def add(self, kind, user_id, amount):
+        user_id = str(user_id)
+        event = {'t': int(datetime.datetime.now().timestamp()), 'k': kind, 'u': user_id, 'd': amount}
+        async with storage_lock('counter_log'):
+            await run_io(self._append, serializer.dumps(event, pretty=False) + b'\n')
+            counts = self.counts[kind]
+            counts[user_id] = counts.get(user_id, 0) + amount
+            return counts[user_id]
+
+    def _append(self, line):
+        if self.handle is None:
+            self.handle = open(self._segment_path(self.segment), 'ab')
+        self.handle.write(line)
+        self.handle.flush()
+        if self.handle.tell() >= COUNTER_LOG_SEGMENT_BYTES:
+            self.handle.close()
+            self.handle = None
+            self.segment += 1
+
+    async def compact_async(self):
+        async with storage_lock('counter_log'):
+            await run_io(self._write_snapshot, *self._begin_compaction())
+
+    def compact(self):
+        self._write_snapshot(*self._begin_compaction())
+
+    def _begin_compaction(self):
+        through = self.segment
+        self.segment += 1
+        return through, serializer.dumps({'segment': through, 'counts': self.counts})
+
+    def _write_snapshot(self, through, payload):
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+        atomic_write(self.snapshot_path, payload)
+        for number in self._segment_numbers():
+            if number <= through:
+                os.remove(self._segment_path(number))
+
+    def close(self):
+        if self.handle:
+            self.handle.close()
+            self.handle = None
+
+counter_log = CounterLog(COUNTER_LOG_DIR)
+
+TICKET_ARCHIVE_DIR = 'ticket_archive'
+RECENTLY_CLOSED_LIMIT = 100
+
+class TicketArchive:
+    """
+    Closed tickets, one gzip-compressed JSONL file per month.
+    index.json keeps the running totals so stats never have to read the archive files.
+    archived_ids.txt lists every archived channel ID, so archiving a ticket twice is a no-op.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.index_path = os.path.join(directory, 'index.json')
+        self.ids_path = os.path.join(directory, 'archived_ids.txt')
+        self.index = {'total': 0, 'categories': {}, 'months': {}}
+        self.archived_ids = set()
+        self.recently_closed = {}
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        try:
+            with open(self.index_path, 'rb') as f:
+                self.index = serializer.loads(f.read())
+        except FileNotFoundError:
+            pass
+        self._load_ids()
+        data = load_data()
+        if data['closed_tickets']:
+            archived = sum(self._append(channel_id, ticket) for channel_id, ticket in data['closed_tickets'].items())
+            print(f"Archived {archived} closed tickets from {DATA_FILE}")
+            data['closed_tickets'] = {}
+            save_data(data)
+            state_store.flush()
+
+    def _load_ids(self):
+        try:
+            with open(self.ids_path, 'r') as f:
+                self.archived_ids = {int(line) for line in f if line.strip()}
+            return
+        except FileNotFoundError:
+            pass
+        for name in sorted(os.listdir(self.directory)):
+            if name.startswith('tickets-') and name.endswith('.jsonl.gz'):
+                for record in self.read_month(name[len('tickets-'):-len('.jsonl.gz')]):
+                    self.archived_ids.add(int(record['channel_id']))
+        atomic_write(self.ids_path, ''.join(f"{channel_id}\n" for channel_id in self.archived_ids).encode())
+
+    def is_archived(self, channel_id):
+        return int(channel_id) in self.archived_ids
+
+    def month_path(self, month):
+        return os.path.join(self.directory, f"tickets-{month}.jsonl.gz")
+
+    def _append(self, channel_id, ticket):
+        """Archive a ticket unless it already is; returns whether it was added."""
+        if self.is_archived(channel_id):
+            return False
+        closed_at = ticket.get('closed_at') or ticket.get('last_activity') or datetime.datetime.now().isoformat()
+        month = closed_at[:7]
+        record = {'channel_id': str(channel_id), 'closed_at': closed_at, 'ticket': ticket}
+        with gzip.open(self.month_path(month), 'ab') as f:
+            f.write(serializer.dumps(record, pretty=False) + b'\n')
+        with open(self.ids_path, 'a') as f:
+            f.write(f"{channel_id}\n")
+        self.archived_ids.add(int(channel_id))
+        category = ticket.get('category', 'Unknown')
+        self.index['total'] += 1
+        self.index['categories'][category] = self.index['categories'].get(category, 0) + 1
+        self.index['months'][month] = self.index['months'].get(month, 0) + 1
+        atomic_write(self.index_path, serializer.dumps(self.index))
+        return True
+
+    async def add(self, channel_id, ticket):
+        self.recently_closed[channel_id] = ticket
+        if len(self.recently_closed) > RECENTLY_CLOSED_LIMIT:
+            self.recently_closed.pop(next(iter(self.recently_closed)))
+        async with storage_lock('ticket_archive'):
+            return await run_io(self._append, channel_id, ticket)
+
+    def read_month(self, month):
+        """Yield the archived records for a month ('YYYY-MM')."""
+        try:
+            with gzip.open(self.month_path(month), 'rb') as f:
+                for line in f:
+                    yield serializer.loads(line)
+        except FileNotFoundError:
+            return
+
+ticket_archive = TicketArchive(TICKET_ARCHIVE_DIR)
+
+class JsonStorage:
+    """
+    Storage backend over the original JSON files.
+    Every call is answered from the in-memory state store; counters go through the counter log.
+    """
+    async def open(self):
+        await run_io(ticket_archive.open)
+        await run_io(counter_log.open)
+
+    async def open_levels(self):
+        """Open only what level reads and writes need, without running migrations."""
+        await run_io(state_store.get, LEVEL_DATA_FILE)
+
+    async def close(self):
+        await run_io(counter_log.close)
+
+    async def compact(self):
+        await counter_log.compact_async()
+
+    async def get_ticket(self, channel_id):
+        return load_data()['tickets'].get(str(channel_id))
+
+    async def save_ticket(self, channel_id, ticket):
+        data = load_data()
+        data['tickets'][str(channel_id)] = ticket
+        save_data(data)
+
+    async def delete_ticket(self, channel_id):
+        data = load_data()
+        data['tickets'].pop(str(channel_id), None)
+        save_data(data)
+
+    async def active_ticket_ids(self):
+        return [int(channel_id) for channel_id in load_data()['tickets']]
+
+    async def ticket_stats(self):
+        data = load_data()
+        categories = {}
+        for ticket in data['tickets'].values():
+            category = ticket.get('category', 'Unknown')
+            categories[category] = categories.get(category, 0) + 1
+        return len(data['tickets']), categories
+
+    async def get_count(self, kind, user_id):
+        return counter_log.counts[kind].get(str(user_id), 0)
+
+    async def add_count(self, kind, user_id, amount):
+        return await counter_log.add(kind, user_id, amount)
+
+    async def all_counts(self, kind):
+        return dict(counter_log.counts[kind])
+
+    async def top_counts(self, kind, limit):
+        return sorted(counter_log.counts[kind].items(), key=lambda x: x[1], reverse=True)[:limit]
+
+    async def get_warnings(self, user_id):
+        return load_warnings()['warnings'].get(str(user_id), [])
+
+    async def add_warning(self, user_id, warning):
+        warnings_data = load_warnings()
+        user_warnings = warnings_data['warnings'].setdefault(str(user_id), [])
+        user_warnings.append(warning)
+        save_warnings(warnings_data)
+        return len(user_warnings)
+
+    async def get_level(self, user_id):
+        return load_level_data().get(str(user_id))
+
+    async def save_level(self, user_id, record):
+        level_data = load_level_data()
+        level_data[str(user_id)] = record
+        save_level_data(level_data)
+
+    async def all_levels(self):
+        return dict(load_level_data())
+
+    async def save_levels(self, records):
+        level_data = load_level_data()
+        level_data.update(records)
+        save_level_data(level_data)
+
+    async def get_expired_echo_levels(self, now):
+        return [
+            (user_id, data) for user_id, data in load_level_data().items()
+            if data.get("level") == 50 and data.get("echo_time") and is_expired(data["echo_time"], now)
+        ]
+
+    async def all_afk(self):
+        return dict(load_afk_data()['afk_users'])
+
+    async def set_afk(self, user_id, record):
+        afk_data = load_afk_data()
+        afk_data['afk_users'][str(user_id)] = record
+        save_afk_data(afk_data)
+
+    async def delete_afk(self, user_id):
+        afk_data = load_afk_data()
+        if afk_data['afk_users'].pop(str(user_id), None) is not None:
+            save_afk_data(afk_data)
+
+    async def set_temp_role(self, user_id, record):
+        temp_roles = load_temp_roles()
+        temp_roles['temp_roles'][str(user_id)] = record
+        save_temp_roles(temp_roles)
+
+    async def delete_temp_role(self, user_id):
+        temp_roles = load_temp_roles()
+        if temp_roles['temp_roles'].pop(str(user_id), None) is not None:
+            save_temp_roles(temp_roles)
+
+    async def get_expired_temp_roles(self, now):
+        return [
+            (user_id, data) for user_id, data in load_temp_roles()['temp_roles'].items()
+            if is_expired(data['end_time'], now)
+        ]
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS tickets (
+    channel_id INTEGER PRIMARY KEY,
+    user_id INTEGER,
+    claimed_by INTEGER,
+    category TEXT,
+    closed INTEGER NOT NULL DEFAULT 0,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tickets_user_id ON tickets(user_id);
+CREATE INDEX IF NOT EXISTS idx_tickets_claimed_by ON tickets(claimed_by);
+CREATE INDEX IF NOT EXISTS idx_tickets_closed_category ON tickets(closed, category);
+CREATE TABLE IF NOT EXISTS user_counts (
+    kind TEXT NOT NULL,
+    user_id INTEGER NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, user_id)
+);
+CREATE INDEX IF NOT EXISTS idx_user_counts_rank ON user_counts(kind, count DESC);
+CREATE TABLE IF NOT EXISTS warnings (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    reason TEXT,
+    warned_by INTEGER,
+    timestamp TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_warnings_user_id ON warnings(user_id);
+CREATE TABLE IF NOT EXISTS levels (
+    user_id INTEGER PRIMARY KEY,
+    xp INTEGER NOT NULL DEFAULT 0,
+    level INTEGER NOT NULL DEFAULT 1,
+    echo_time TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_levels_echo_time ON levels(echo_time) WHERE echo_time IS NOT NULL;
+CREATE TABLE IF NOT EXISTS afk_users (
+    user_id INTEGER PRIMARY KEY,
+    original_nickname TEXT,
+    reason TEXT,
+    end_time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_afk_users_end_time ON afk_users(end_time);
+CREATE TABLE IF NOT EXISTS temp_roles (
+    user_id INTEGER PRIMARY KEY,
+    role_id INTEGER NOT NULL,
+    end_time TEXT NOT NULL,
+    added_by INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_temp_roles_end_time ON temp_roles(end_time);
+"""
+
+class SqliteStorage:
+    """
+    Storage backend on a single SQLite database in WAL mode.
+    Queries run in the persistence pool; on first open the existing JSON files are imported once.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.conn = None
+        self.lock = threading.Lock()
+
+    async def _call(self, func, *args):
+        def locked():
+            with self.lock:
+                return func(*args)
+        return await run_io(locked)
+
+    async def open(self):
+        await run_io(ticket_archive.open)
+        await self._call(self._open)
+
+    async def open_levels(self):
+        """Open only what level reads and writes need, without running migrations."""
+        await self._call(self._connect)
+
+    def _connect(self):
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SQLITE_SCHEMA)
+
+    def _open(self):
+        self._connect()
+        self.import_json()
+        self.archive_closed()
+
+    async def close(self):
+        if self.conn:
+            await self._call(self.conn.close)
+            self.conn = None
+
+    async def compact(self):
+        await self._call(self.conn.execute, "PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def import_json(self):
+        if self.conn.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            return
+        data = load_data()
+        user_counts, _, _ = counter_log.load()
+        with self.conn:
+            for closed, tickets in ((0, data['tickets']), (1, data['closed_tickets'])):
+                for channel_id, ticket in tickets.items():
+                    self._write_ticket(channel_id, ticket, closed)
+            for kind, counts in user_counts.items():
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO user_counts (kind, user_id, count) VALUES (?, ?, ?)",
+                    [(kind, int(user_id), count) for user_id, count in counts.items()]
+                )
+            for user_id, user_warnings in load_warnings()['warnings'].items():
+                self.conn.executemany(
+                    "INSERT INTO warnings (user_id, reason, warned_by, timestamp) VALUES (?, ?, ?, ?)",
+                    [(int(user_id), w['reason'], w['warned_by'], w['timestamp']) for w in user_warnings]
+                )
+            for user_id, record in load_level_data().items():
+                self._write_level(user_id, record)
+            for user_id, record in load_afk_data()['afk_users'].items():
+                self._write_afk(user_id, record)
+            for user_id, record in load_temp_roles()['temp_roles'].items():
+                self._write_temp_role(user_id, record)
+            self.conn.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (datetime.datetime.now().isoformat(),))
+        print(f"Imported JSON data into {self.path}")
+
+    def archive_closed(self):
+        rows = self.conn.execute("SELECT channel_id, data FROM tickets WHERE closed = 1").fetchall()
+        if not rows:
+            return
+        archived = sum(ticket_archive._append(row['channel_id'], serializer.loads(row['data'])) for row in rows)
+        with self.conn:
+            self.conn.execute("DELETE FROM tickets WHERE closed = 1")
+        print(f"Archived {archived} closed tickets from {self.path}")
+
+    def _write_ticket(self, channel_id, ticket, closed=0):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO tickets (channel_id, user_id, claimed_by, category, closed, data) VALUES (?, ?, ?, ?, ?, ?)",
+            (int(channel_id), ticket.get('user_id'), ticket.get('claimed_by'), ticket.get('category'), closed, serializer.dumps(ticket, pretty=False).decode('utf-8'))
+        )
+
+    def _write_level(self, user_id, record):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO levels (user_id, xp, level, echo_time) VALUES (?, ?, ?, ?)",
+            (int(user_id), record['xp'], record['level'], record.get('echo_time'))
+        )
+
+    def _write_afk(self, user_id, record):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO afk_users (user_id, original_nickname, reason, end_time) VALUES (?, ?, ?, ?)",
+            (int(user_id), record['original_nickname'], record['reason'], record['end_time'])
+        )
+
+    def _write_temp_role(self, user_id, record):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO temp_roles (user_id, role_id, end_time, added_by) VALUES (?, ?, ?, ?)",
+            (int(user_id), record['role_id'], record['end_time'], record.get('added_by'))
+        )
+
+    def _fetchone(self, sql, params):
+        return self.conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql, params):
+        return self.conn.execute(sql, params).fetchall()
+
+    def _transaction(self, func, *args):
+        with self.conn:
+            return func(*args)
+
+    async def get_ticket(self, channel_id):
+        row = await self._call(self._fetchone, "SELECT data FROM tickets WHERE channel_id = ? AND closed = 0", (int(channel_id),))
+        return serializer.loads(row['data']) if row else None
+
+    async def save_ticket(self, channel_id, ticket):
+        await self._call(self._transaction, self._write_ticket, channel_id, ticket)
+
+    async def delete_ticket(self, channel_id):
+        await self._call(self._transaction, self.conn.execute, "DELETE FROM tickets WHERE channel_id = ?", (int(channel_id),))
+
+    async def active_ticket_ids(self):
+        rows = await self._call(self._fetchall, "SELECT channel_id FROM tickets WHERE closed = 0", ())
+        return [row['channel_id'] for row in rows]
+
+    async def ticket_stats(self):
+        def query():
+            active = self.conn.execute("SELECT COUNT(*) FROM tickets WHERE closed = 0").fetchone()[0]
+            rows = self.conn.execute("SELECT category, COUNT(*) FROM tickets WHERE closed = 0 GROUP BY category").fetchall()
+            return active, {(row[0] or 'Unknown'): row[1] for row in rows}
+        return await self._call(query)
+
+    async def get_count(self, kind, user_id):
+        row = await self._call(self._fetchone, "SELECT count FROM user_counts WHERE kind = ? AND user_id = ?", (kind, int(user_id)))
+        return row['count'] if row else 0
+
+    async def add_count(self, kind, user_id, amount):
+        def write():
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO user_counts (kind, user_id, count) VALUES (?, ?, ?) "
+                    "ON CONFLICT (kind, user_id) DO UPDATE SET count = count + excluded.count",
+                    (kind, int(user_id), amount)
+                )
+            return self.conn.execute("SELECT count FROM user_counts WHERE kind = ? AND user_id = ?", (kind, int(user_id))).fetchone()[0]
+        return await self._call(write)
+
+    async def all_counts(self, kind):
+        rows = await self._call(self._fetchall, "SELECT user_id, count FROM user_counts WHERE kind = ?", (kind,))
+        return {str(row['user_id']): row['count'] for row in rows}
+
+    async def top_counts(self, kind, limit):
+        rows = await self._call(
+            self._fetchall, "SELECT user_id, count FROM user_counts WHERE kind = ? ORDER BY count DESC LIMIT ?", (kind, limit)
+        )
+        return [(str(row['user_id']), row['count']) for row in rows]
+
+    async def get_warnings(self, user_id):
+        rows = await self._call(
+            self._fetchall, "SELECT reason, warned_by, timestamp FROM warnings WHERE user_id = ? ORDER BY id", (int(user_id),)
+        )
+        return [dict(row) for row in rows]
+
+    async def add_warning(self, user_id, warning):
+        def write():
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO warnings (user_id, reason, warned_by, timestamp) VALUES (?, ?, ?, ?)",
+                    (int(user_id), warning['reason'], warning['warned_by'], warning['timestamp'])
+                )
+            return self.conn.execute("SELECT COUNT(*) FROM warnings WHERE user_id = ?", (int(user_id),)).fetchone()[0]
+        return await self._call(write)
+
+    async def get_level(self, user_id):
+        row = await self._call(self._fetchone, "SELECT xp, level, echo_time FROM levels WHERE user_id = ?", (int(user_id),))
+        return dict(row) if row else None
+
+    async def save_level(self, user_id, record):
+        await self._call(self._transaction, self._write_level, user_id, record)
+
+    async def all_levels(self):
+        rows = await self._call(self._fetchall, "SELECT user_id, xp, level, echo_time FROM levels", ())
+        return {str(row['user_id']): {'xp': row['xp'], 'level': row['level'], 'echo_time': row['echo_time']} for row in rows}
+
+    async def save_levels(self, records):
+        def write():
+            with self.conn:
+                for user_id, record in records.items():
+                    self._write_level(user_id, record)
+        await self._call(write)
+
+    async def get_expired_echo_levels(self, now):
+        rows = await self._call(
+            self._fetchall,
+            "SELECT user_id, xp, level, echo_time FROM levels WHERE echo_time IS NOT NULL AND echo_time <= ? AND level = 50",
+            (now.isoformat(),)
+        )
+        return [(str(row['user_id']), {'xp': row['xp'], 'level': row['level'], 'echo_time': row['echo_time']}) for row in rows]
+
+    async def all_afk(self):
+        rows = await self._call(self._fetchall, "SELECT user_id, original_nickname, reason, end_time FROM afk_users", ())
+        return {str(row['user_id']): {k: row[k] for k in ('original_nickname', 'reason', 'end_time')} for row in rows}
+
+    async def set_afk(self, user_id, record):
+        await self._call(self._transaction, self._write_afk, user_id, record)
+
+    async def delete_afk(self, user_id):
+        await self._call(self._transaction, self.conn.execute, "DELETE FROM afk_users WHERE user_id = ?", (int(user_id),))
 
-def load_report_counts():
+    async def set_temp_role(self, user_id, record):
+        await self._call(self._transaction, self._write_temp_role, user_id, record)
+
+    async def delete_temp_role(self, user_id):
+        await self._call(self._transaction, self.conn.execute, "DELETE FROM temp_roles WHERE user_id = ?", (int(user_id),))
+
+    async def get_expired_temp_roles(self, now):
+        rows = await self._call(
+            self._fetchall, "SELECT user_id, role_id, end_time, added_by FROM temp_roles WHERE end_time <= ?", (now.isoformat(),)
+        )
+        return [(str(row['user_id']), {k: row[k] for k in ('role_id', 'end_time', 'added_by')}) for row in rows]
+
+storage = SqliteStorage(SQLITE_DB_FILE) if STORAGE_BACKEND == 'sqlite' else JsonStorage()
+
+@tasks.loop(minutes=STORAGE_COMPACT_INTERVAL)
+async def compact_storage():
     try:
-        with open(REPORT_COUNTS_FILE, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        return {'user_report_counts': {}}
+        await storage.compact()
+    except Exception as e:
+        print(f"Error compacting storage: {e}")
+
+PRIORITY_PUNITIVE = 0  # bans, kicks, timeouts
+PRIORITY_INTERACTION = 1  # work a user is waiting on
+PRIORITY_NOTIFICATION = 2  # moderation and workflow DMs
+PRIORITY_COSMETIC = 3  # presence, announcements, nicknames, reward roles
+OUTBOUND_CLASS_LIMITS = {PRIORITY_PUNITIVE: 8, PRIORITY_INTERACTION: 8, PRIORITY_NOTIFICATION: 4, PRIORITY_COSMETIC: 2}
+OUTBOUND_ROUTE_LIMIT = 2  # concurrent calls per route
+
+class PrioritySlots:
+    """Counting semaphore that wakes the waiter with the lowest priority value first."""
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.waiters = []
+        self.order = itertools.count()
+
+    async def acquire(self, priority):
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.order), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self.waiters:
+            _, _, future = heapq.heappop(self.waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+class OutboundScheduler:
+    """
+    Gate for outbound Discord calls. Each call names a priority class and a route
+    (such as ('members', guild_id) or ('channel', channel_id)). Classes have their own
+    concurrency caps, so cosmetic floods cannot take slots from punitive or interaction
+    work, and each route admits OUTBOUND_ROUTE_LIMIT calls at a time, highest priority first.
+    A route's slots are dropped as soon as no call is using or waiting for them.
+    """
+    def __init__(self, class_limits, route_limit):
+        self.classes = {priority: PrioritySlots(limit) for priority, limit in class_limits.items()}
+        self.route_limit = route_limit
+        self.routes = {}  # route -> [slots, calls using or waiting for them]
+        self.metrics = {priority: {'queued': 0, 'running': 0, 'done': 0, 'failed': 0, 'total_wait': 0.0, 'max_wait': 0.0}
+                        for priority in class_limits}
+
+    async def run(self, priority, route, func, *args, **kwargs):
+        entry = self.routes.get(route)
+        if entry is None:
+            entry = self.routes[route] = [PrioritySlots(self.route_limit), 0]
+        entry[1] += 1
+        try:
+            return await self._run(priority, entry[0], func, *args, **kwargs)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.routes[route]
+
+    async def _run(self, priority, slots, func, *args, **kwargs):
+        metrics = self.metrics[priority]
+        queued_at = time.monotonic()
+        metrics['queued'] += 1
+        try:
+            await self.classes[priority].acquire(priority)
+            try:
+                await slots.acquire(priority)
+            except BaseException:
+                self.classes[priority].release()
+                raise
+        finally:
+            metrics['queued'] -= 1
+        wait = time.monotonic() - queued_at
+        metrics['total_wait'] += wait
+        metrics['max_wait'] = max(metrics['max_wait'], wait)
+        metrics['running'] += 1
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException:
+            metrics['failed'] += 1
+            raise
+        else:
+            metrics['done'] += 1
+            return result
+        finally:
+            metrics['running'] -= 1
+            slots.release()
+            self.classes[priority].release()
+
+    def stats(self):
+        names = {PRIORITY_PUNITIVE: 'punitive', PRIORITY_INTERACTION: 'interaction',
+                 PRIORITY_NOTIFICATION: 'notification', PRIORITY_COSMETIC: 'cosmetic'}
+        stats = {'routes': len(self.routes)}
+        for priority, metrics in self.metrics.items():
+            finished = metrics['done'] + metrics['failed']
+            stats[names[priority]] = dict(metrics, avg_wait=metrics['total_wait'] / finished if finished else 0.0)
+        return stats
+
+outbound = OutboundScheduler(OUTBOUND_CLASS_LIMITS, OUTBOUND_ROUTE_LIMIT)
+DIAGNOSTICS['outbound'] = outbound.stats
+
+async def set_presence(name):
+    await outbound.run(
+        PRIORITY_COSMETIC, ('presence',), bot.change_presence,
+        activity=discord.Activity(type=discord.ActivityType.playing, name=name)
+    )
+
+DM_WORKERS = 4
+DM_MAX_ATTEMPTS = 4
+DM_RETRY_DELAY = 2  # seconds before the first retry, doubled for each later one
+DM_CLOSED_TTL = 6 * 60 * 60  # seconds to skip users whose DMs are closed
+DM_DRAIN_TIMEOUT = 10  # seconds to wait for queued DMs on shutdown
+
+class DmDispatcher:
+    """
+    Fire-and-forget DM queue served by a small worker pool.
+    Transient failures (rate limits, 5xx, network errors) are retried with exponential
+    backoff; users with closed DMs are remembered for DM_CLOSED_TTL and skipped.
+    On shutdown, DMs waiting for a retry are tried once more while the queue drains.
+    """
+    def __init__(self, workers):
+        self.worker_count = workers
+        self.queue = None
+        self.workers = []
+        self.retries = {}  # retry number -> (timer handle, queued item)
+        self.retry_ids = itertools.count()
+        self.closed_dms = {}
+        self.counts = {'queued': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'closed': 0, 'skipped': 0}
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+
+    async def stop(self):
+        if self.queue is None:
+            return
+        for handle, item in self.retries.values():
+            handle.cancel()
+            self.queue.put_nowait(item)
+        self.retries = {}
+        try:
+            await asyncio.wait_for(self.queue.join(), DM_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"Dropping {self.queue.qsize()} undelivered DMs")
+        if self.retries:
+            print(f"Dropping {len(self.retries)} DMs waiting to be retried")
+            for handle, _ in self.retries.values():
+                handle.cancel()
+            self.retries = {}
+        for worker in self.workers:
+            worker.cancel()
+        self.queue = None
+
+    def send(self, user, **kwargs):
+        """Queue a DM to a user (or user ID); returns immediately."""
+        user_id = user if isinstance(user, int) else user.id
+        closed_until = self.closed_dms.get(user_id)
+        if closed_until is not None:
+            if closed_until > time.monotonic():
+                self.counts['skipped'] += 1
+                return
+            del self.closed_dms[user_id]
+        if self.queue is None:
+            return
+        self.counts['queued'] += 1
+        self.queue.put_nowait((user, kwargs, 1))
 
-def save_report_counts(data):
-    with open(REPORT_COUNTS_FILE, 'w') as f:
-        json.dump(data, f, indent=2)
+    async def _worker(self):
+        while True:
+            item = await self.queue.get()
+            try:
+                await self._deliver(*item)
+            except Exception as e:
+                print(f"Error delivering DM: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _deliver(self, user, kwargs, attempt):
+        user_id = user if isinstance(user, int) else user.id
+        try:
+            if isinstance(user, int):
+                user = bot.get_user(user_id) or await bot.fetch_user(user_id)
+            await outbound.run(PRIORITY_NOTIFICATION, ('dm', user_id), user.send, **kwargs)
+            self.counts['sent'] += 1
+        except discord.Forbidden:
+            self.closed_dms[user_id] = time.monotonic() + DM_CLOSED_TTL
+            self.counts['closed'] += 1
+        except (discord.HTTPException, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            status = getattr(e, 'status', None)
+            if (status is not None and status < 500 and status != 429) or attempt >= DM_MAX_ATTEMPTS:
+                self.counts['failed'] += 1
+                print(f"Could not send DM to {user_id}: {e}")
+                return
+            self.counts['retried'] += 1
+            delay = DM_RETRY_DELAY * 2 ** (attempt - 1) * random.uniform(0.8, 1.2)
+            item = (user, kwargs, attempt + 1)
+            retry_id = next(self.retry_ids)
+            handle = asyncio.get_running_loop().call_later(delay, self._requeue, retry_id)
+            self.retries[retry_id] = (handle, item)
+
+    def stats(self):
+        return dict(
+            self.counts,
+            pending=self.queue.qsize() if self.queue else 0,
+            retrying=len(self.retries),
+            closed_cached=len(self.closed_dms)
+        )
+
+    def _requeue(self, retry_id):
+        _, item = self.retries.pop(retry_id)
+        if self.queue is not None:
+            self.queue.put_nowait(item)
+
+dm_dispatcher = DmDispatcher(DM_WORKERS)
+DIAGNOSTICS['dm_dispatcher'] = dm_dispatcher.stats
+
+LOG_SINK_INTERVAL = 2  # seconds
+LOG_SINK_MAX_EMBEDS = 10
+LOG_SINK_MAX_CHARS = 6000  # Discord's limit across all embeds in one message
+LOG_SINK_MAX_FILES = 10
+LOG_SINK_MAX_UPLOAD = 8 * 1024 * 1024
+
+def file_size(file):
+    fp = file.fp
+    position = fp.tell()
+    size = fp.seek(0, io.SEEK_END)
+    fp.seek(position)
+    return size
+
+class LogSink:
+    """
+    Per-channel queue for log embeds. Every LOG_SINK_INTERVAL seconds each queue is sent
+    as few messages as possible, packing up to 10 embeds (and their files) per message.
+    Mentions given with an embed go in the message content so the user is pinged.
+    Priority posts are sent straight away.
+    """
+    def __init__(self):
+        self.queues = {}
+        self.channels = {}
+        self.max_depth = 0
+        self.messages_sent = 0
+        self.embeds_sent = 0
+        self.last_latency = 0.0
+        self.max_latency = 0.0
+        self.total_latency = 0.0
+
+    async def post(self, channel, embed, file=None, priority=False, mention=None):
+        """Queue a log embed; priority posts are sent at once and return whether they were delivered."""
+        item = (time.monotonic(), embed, file, priority, mention)
+        if priority:
+            return await self._deliver(channel, [item])
+        self.channels[channel.id] = channel
+        self.queues.setdefault(channel.id, []).append(item)
+        self.max_depth = max(self.max_depth, self.depth())
+
+    def depth(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def _take_batch(self, queue):
+        count = chars = files = upload = 0
+        for _, embed, file, _, _ in queue:
+            size = file_size(file) if file else 0
+            if count and (count == LOG_SINK_MAX_EMBEDS or chars + len(embed) > LOG_SINK_MAX_CHARS
+                          or (file and (files == LOG_SINK_MAX_FILES or upload + size > LOG_SINK_MAX_UPLOAD))):
+                break
+            count += 1
+            chars += len(embed)
+            if file:
+                files += 1
+                upload += size
+        batch = queue[:count]
+        del queue[:count]
+        return batch
+
+    async def _deliver(self, channel, batch):
+        embeds = [embed for _, embed, _, _, _ in batch]
+        files = [file for _, _, file, _, _ in batch if file]
+        content = ' '.join(mention for _, _, _, _, mention in batch if mention) or None
+        priority = PRIORITY_INTERACTION if len(batch) == 1 and batch[0][3] else PRIORITY_COSMETIC
+        try:
+            await outbound.run(
+                priority, ('channel', channel.id), channel.send,
+                content=content, embeds=embeds, files=files,
+                allowed_mentions=discord.AllowedMentions(users=True)
+            )
+        except Exception as e:
+            print(f"Error sending {len(embeds)} log embeds to {channel}: {e}")
+            return False
+        latency = time.monotonic() - batch[0][0]
+        self.messages_sent += 1
+        self.embeds_sent += len(embeds)
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self.total_latency += latency
+        return True
+
+    async def flush(self):
+        for channel_id in list(self.queues):
+            queue = self.queues.pop(channel_id)
+            channel = self.channels.pop(channel_id)
+            while queue:
+                await self._deliver(channel, self._take_batch(queue))
+
+    def stats(self):
+        return {
+            'queue_depth': self.depth(),
+            'max_queue_depth': self.max_depth,
+            'messages_sent': self.messages_sent,
+            'embeds_sent': self.embeds_sent,
+            'last_flush_latency': self.last_latency,
+            'max_flush_latency': self.max_latency,
+            'avg_flush_latency': self.total_latency / self.messages_sent if self.messages_sent else 0.0
+        }
+
+log_sink = LogSink()
+DIAGNOSTICS['log_sink'] = log_sink.stats
+
+@tasks.loop(seconds=LOG_SINK_INTERVAL)
+async def flush_log_sink():
+    await log_sink.flush()
 
 def has_staff_permissions(user):
     staff_roles = [TRIAL_ROLE_ID, HELPER_ROLE_ID, MOD_ROLE_ID, TICKET_ADMIN_ROLE_ID]
@@ -165,18 +1298,761 @@ def get_category_for_ticket_type(ticket_type):
     }
     return category_mapping.get(ticket_type, SUPPORT_CATEGORY_ID)
 
-async def get_minecraft_head_url(username):
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f'https://api.mojang.com/users/profiles/minecraft/{username}') as resp:
+def untracked_ticket_record(channel):
+    return {
+        'user_id': channel.topic.split('|')[0] if channel.topic else None,
+        'username': 'Unknown',
+        'type': channel.category.name if channel.category else 'Unknown',
+        'category': channel.category.name if channel.category else 'Unknown',
+        'created_at': datetime.datetime.now().isoformat(),
+        'last_activity': datetime.datetime.now().isoformat(),
+        'claimed_by': None,
+        'warning_sent': False
+    }
+
+async def mark_ticket_closing(channel, create_missing=False):
+    """
+    Flag a ticket as closing so concurrent close requests cannot both count it.
+    Returns (ticket_data, already_closing); ticket_data is None for unknown tickets.
+    """
+    async with storage_lock('tickets'):
+        if channel.id in ticket_archive.recently_closed:
+            return ticket_archive.recently_closed[channel.id], True
+        if close_jobs.pending(channel.id):
+            return close_jobs.jobs[channel.id]['ticket'], True
+        ticket_data = await storage.get_ticket(channel.id)
+        if ticket_data is None:
+            if not create_missing:
+                return None, False
+            ticket_data = untracked_ticket_record(channel)
+        if ticket_data.get('closing'):
+            return ticket_data, True
+        ticket_data['closing'] = True
+        await storage.save_ticket(channel.id, ticket_data)
+        return ticket_data, False
+
+async def archive_ticket(channel_id, ticket_data, closed_by=None):
+    """Move a ticket from the active set into the archive."""
+    ticket_data.pop('closing', None)
+    ticket_data.pop('close_counted', None)
+    ticket_data['closed_by'] = closed_by
+    ticket_data['closed_at'] = datetime.datetime.now().isoformat()
+    async with storage_lock('tickets'):
+        await ticket_archive.add(channel_id, ticket_data)
+        await storage.delete_ticket(channel_id)
+    ticket_activity_written.pop(channel_id, None)
+    storage_locks.pop(f'ticket_permissions:{channel_id}', None)
+    await ticket_capture.discard(channel_id)
+
+def plan_ticket_overwrites(guild, ticket_data):
+    """
+    Target permission overwrites for a ticket. Open tickets are visible to every staff role;
+    claimed tickets only to ticket admins, the creator and the claimer. Users added with
+    /add_user are allowed and users removed with /remove_user are denied either way,
+    even if they created or claimed the ticket.
+    """
+    allow = discord.PermissionOverwrite(read_messages=True, send_messages=True)
+    deny = discord.PermissionOverwrite(read_messages=False, send_messages=False)
+    claimed_by = ticket_data.get('claimed_by')
+    overwrites = {guild.default_role: discord.PermissionOverwrite(read_messages=False)}
+    for role_id in (TRIAL_ROLE_ID, HELPER_ROLE_ID, MOD_ROLE_ID, TICKET_ADMIN_ROLE_ID):
+        role = guild.get_role(role_id)
+        if role:
+            overwrites[role] = deny if claimed_by and role_id != TICKET_ADMIN_ROLE_ID else allow
+    removed_users = {int(member_id) for member_id in ticket_data.get('removed_users', [])}
+    for member_id in removed_users:
+        member = guild.get_member(member_id)
+        if member:
+            overwrites[member] = deny
+    for member_id in [ticket_data.get('user_id'), claimed_by] + ticket_data.get('extra_users', []):
+        if not member_id or int(member_id) in removed_users:
+            continue
+        member = guild.get_member(int(member_id))
+        if member:
+            overwrites[member] = allow
+    return overwrites
+
+async def sync_ticket_permissions(channel):
+    """
+    Apply the planned overwrites from the latest ticket record in one channel edit.
+    Overwrites the plan does not mention are kept; nothing is sent when already in place.
+    """
+    async with storage_lock(f'ticket_permissions:{channel.id}'):
+        ticket_data = await storage.get_ticket(channel.id)
+        if ticket_data is None:
+            return False
+        overwrites = dict(channel.overwrites)
+        overwrites.update(plan_ticket_overwrites(channel.guild, ticket_data))
+        if overwrites == channel.overwrites:
+            return False
+        await outbound.run(PRIORITY_INTERACTION, ('channel', channel.id), channel.edit, overwrites=overwrites)
+        return True
+
+async def update_ticket_users(channel, add=None, remove=None):
+    """Record a user added to or removed from a ticket, then sync its permissions."""
+    async with storage_lock('tickets'):
+        ticket_data = await storage.get_ticket(channel.id) or untracked_ticket_record(channel)
+        extra_users = ticket_data.setdefault('extra_users', [])
+        removed_users = ticket_data.setdefault('removed_users', [])
+        if add:
+            if add.id in removed_users:
+                removed_users.remove(add.id)
+            if add.id not in extra_users:
+                extra_users.append(add.id)
+        if remove:
+            if remove.id in extra_users:
+                extra_users.remove(remove.id)
+            if remove.id not in removed_users:
+                removed_users.append(remove.id)
+        await storage.save_ticket(channel.id, ticket_data)
+    await sync_ticket_permissions(channel)
+
+TRANSCRIPT_FORMAT = 'txt'  # 'txt' or 'html'
+TRANSCRIPT_SPOOL_BYTES = 1024 * 1024  # compressed bytes kept in memory before spilling to disk
+TRANSCRIPT_EMBED_CHARS = 200
+
+HTML_TRANSCRIPT_HEAD = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>body{{font-family:sans-serif;background:#313338;color:#dbdee1}}.m{{margin:4px 0}}.t{{color:#949ba4;font-size:12px}}.a{{font-weight:bold}}.x{{margin-left:24px;color:#b5bac1}}</style>
+</head><body><h2>{title}</h2>
+"""
+
+def embed_summary(embed):
+    parts = [part for part in (embed.title, embed.description) if part]
+    parts.extend(f"{field.name}: {field.value}" for field in embed.fields)
+    summary = " | ".join(parts).replace("\n", " ")
+    if len(summary) > TRANSCRIPT_EMBED_CHARS:
+        summary = summary[:TRANSCRIPT_EMBED_CHARS - 3] + "..."
+    return summary
+
+class TranscriptWriter:
+    """
+    Streams ticket messages into a gzip-compressed text or HTML transcript.
+    Output goes to a SpooledTemporaryFile, so memory stays bounded by
+    TRANSCRIPT_SPOOL_BYTES however long the ticket is.
+    """
+    def __init__(self, title, fmt=TRANSCRIPT_FORMAT):
+        self.fmt = fmt
+        self.count = 0
+        self.file = tempfile.SpooledTemporaryFile(max_size=TRANSCRIPT_SPOOL_BYTES)
+        self.gzip = gzip.GzipFile(fileobj=self.file, mode='wb', compresslevel=6)
+        if fmt == 'html':
+            self._write(HTML_TRANSCRIPT_HEAD.format(title=html.escape(title)))
+        else:
+            self._write(f"Transcript of #{title}\n\n")
+
+    def _write(self, text):
+        self.gzip.write(text.encode('utf-8'))
+
+    def add(self, record):
+        """Write one message record (see message_record)."""
+        self.count += 1
+        timestamp = record['ts'][:19].replace('T', ' ') + ' UTC'
+        flags = ''.join(f" ({flag})" for flag in ('edited', 'deleted') if record.get(flag))
+        extras = [f"[attachment] {filename} {url}" for filename, url in record['attachments']]
+        extras.extend(f"[embed] {summary}" for summary in record['embeds'])
+        if self.fmt == 'html':
+            lines = [
+                f'<div class="m"><span class="t">{timestamp}</span> <span class="a">{html.escape(record["author"])}</span>'
+                f'{flags}: {html.escape(record["content"])}</div>'
+            ]
+            lines.extend(f'<div class="x">{html.escape(extra)}</div>' for extra in extras)
+        else:
+            lines = [f"[{timestamp}] {record['author']} ({record['author_id']}){flags}: {record['content']}"]
+            lines.extend(f"    {extra}" for extra in extras)
+        self._write("\n".join(lines) + "\n")
+
+    def finish(self, name):
+        """Close the stream and return it as a discord.File ready for upload."""
+        if self.fmt == 'html':
+            self._write("</body></html>\n")
+        self.gzip.close()
+        self.file.seek(0)
+        # SpooledTemporaryFile only subclasses IOBase from Python 3.11 on
+        fp = self.file if isinstance(self.file, io.IOBase) else self.file._file
+        return discord.File(fp, filename=f"{name}.{self.fmt}.gz")
+
+TICKET_LOG_DIR = 'ticket_logs'
+
+def message_record(message):
+    return {
+        'id': message.id,
+        'ts': message.created_at.isoformat(),
+        'author': message.author.name,
+        'author_id': message.author.id,
+        'content': message.content,
+        'attachments': [[attachment.filename, attachment.url] for attachment in message.attachments],
+        'embeds': [embed_summary(embed) for embed in message.embeds],
+        'edited': message.edited_at is not None
+    }
+
+class TicketCapture:
+    """
+    Per-ticket JSONL log of messages, edits and deletes, appended as they happen.
+    Building a transcript then only fetches history newer than the last captured
+    message ID instead of the whole channel.
+    A channel only takes live messages once it is synced: the first capture in a
+    process (or after a reconnect) fetches the gap since the last captured message,
+    so the log never skips messages sent while the bot was offline.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self.last_ids = {}
+        self.synced = set()
+
+    def path(self, channel_id):
+        return os.path.join(self.directory, f"{channel_id}.jsonl")
+
+    def lock(self, channel_id):
+        return storage_lock(f'ticket_capture:{channel_id}')
+
+    def is_ticket_channel(self, channel):
+        return (channel is not None and getattr(channel, 'category_id', None) in TICKET_CATEGORY_IDS
+                and channel.id not in ticket_archive.recently_closed)
+
+    def _write(self, channel_id, events):
+        os.makedirs(self.directory, exist_ok=True)
+        with open(self.path(channel_id), 'ab') as f:
+            f.write(b''.join(serializer.dumps(event, pretty=False) + b'\n' for event in events))
+
+    def _events(self, channel_id):
+        try:
+            with open(self.path(channel_id), 'rb') as f:
+                for line in f:
+                    try:
+                        yield serializer.loads(line)
+                    except serializer.decode_errors as e:
+                        print(f"Skipping bad ticket log entry for {channel_id}: {e}")
+        except FileNotFoundError:
+            return
+
+    def _scan_last_id(self, channel_id):
+        return max((event['id'] for event in self._events(channel_id) if event['e'] == 'create'), default=0)
+
+    async def last_id(self, channel_id):
+        if channel_id not in self.last_ids:
+            self.last_ids[channel_id] = await run_io(self._scan_last_id, channel_id)
+        return self.last_ids[channel_id]
+
+    async def _append(self, channel_id, events):
+        await run_io(self._write, channel_id, events)
+        created = [event['id'] for event in events if event['e'] == 'create']
+        if created:
+            self.last_ids[channel_id] = max(created + [await self.last_id(channel_id)])
+
+    async def capture(self, message):
+        async with self.lock(message.channel.id):
+            if message.channel.id not in self.synced:
+                await self._fill_gap(message.channel)
+            if message.id > await self.last_id(message.channel.id):
+                await self._append(message.channel.id, [dict(message_record(message), e='create')])
+
+    async def capture_edit(self, channel_id, message_id, data):
+        event = {'e': 'edit', 'id': message_id}
+        if 'content' in data:
+            event['content'] = data['content']
+        if 'embeds' in data:
+            event['embeds'] = [embed_summary(discord.Embed.from_dict(embed)) for embed in data['embeds']]
+        if len(event) > 2:
+            async with self.lock(channel_id):
+                await self._append(channel_id, [event])
+
+    async def capture_delete(self, channel_id, message_ids):
+        async with self.lock(channel_id):
+            await self._append(channel_id, [{'e': 'delete', 'id': message_id} for message_id in message_ids])
+
+    async def _fill_gap(self, channel):
+        last_id = await self.last_id(channel.id)
+        batch = []
+        count = 0
+        async for message in channel.history(limit=None, after=discord.Object(id=last_id) if last_id else None, oldest_first=True):
+            batch.append(dict(message_record(message), e='create'))
+            if len(batch) == 100:
+                await self._append(channel.id, batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            await self._append(channel.id, batch)
+            count += len(batch)
+        self.synced.add(channel.id)
+        return count
+
+    async def fill_gap(self, channel):
+        """Capture anything sent since the last captured message, e.g. while the bot was offline."""
+        async with self.lock(channel.id):
+            return await self._fill_gap(channel)
+
+    def _replay(self, channel_id, writer):
+        edits = {}
+        deleted = set()
+        for event in self._events(channel_id):
+            if event['e'] == 'edit':
+                edits.setdefault(event['id'], {}).update(event)
+            elif event['e'] == 'delete':
+                deleted.add(event['id'])
+        written = set()
+        for event in self._events(channel_id):
+            if event['e'] != 'create' or event['id'] in written:
+                continue
+            written.add(event['id'])
+            edit = edits.get(event['id'])
+            if edit:
+                event.update(edit, edited=True)
+            if event['id'] in deleted:
+                event['deleted'] = True
+            writer.add(event)
+
+    async def transcript(self, channel, fmt=TRANSCRIPT_FORMAT):
+        writer = TranscriptWriter(channel.name, fmt)
+        async with self.lock(channel.id):
+            await self._fill_gap(channel)
+            await run_io(self._replay, channel.id, writer)
+        return writer.finish(f"transcript-{channel.name}")
+
+    async def discard(self, channel_id):
+        async with self.lock(channel_id):
+            try:
+                await run_io(os.remove, self.path(channel_id))
+            except FileNotFoundError:
+                pass
+            self.last_ids.pop(channel_id, None)
+            self.synced.discard(channel_id)
+        storage_locks.pop(f'ticket_capture:{channel_id}', None)
+
+ticket_capture = TicketCapture(TICKET_LOG_DIR)
+
+CLOSE_JOBS_FILE = 'close_jobs.jsonl'
+CLOSE_DELETE_DELAY = 5  # seconds between the close request and channel deletion
+CLOSE_STAGES = ('count', 'transcript', 'archive', 'delete')
+CLOSE_MAX_ATTEMPTS = 4  # tries per close before the job is dropped and the ticket released
+CLOSE_RETRY_DELAY = 5  # seconds before the first retry, doubled for each later one
+
+class CloseJobQueue:
+    """
+    Durable queue of ticket closes, run by a background worker so the interaction
+    can be acknowledged at once. Each stage is journaled to CLOSE_JOBS_FILE before it
+    runs, so a close interrupted by a restart resumes with that stage at the next startup.
+    A failing stage is retried with backoff; after CLOSE_MAX_ATTEMPTS the job is dropped and
+    the ticket released so it can be closed again. A 'counted' marker is journaled once the
+    count stage has written the counter; until then a retried or resumed close runs the count
+    again, and after it the count is never repeated, even across a released and re-submitted close.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.jobs = {}
+        self.queue = None
+        self.worker = None
+        self.handle = None
+        self.retries = {}
+        self.stage_times = {stage: [0.0, 0] for stage in CLOSE_STAGES}
+        self.counts = {'submitted': 0, 'completed': 0, 'resumed': 0, 'retried': 0, 'failed': 0}
+
+    def open(self):
+        """Replay the journal and rewrite it with only the unfinished jobs."""
+        try:
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    try:
+                        event = serializer.loads(line)
+                        if event['stage'] == 'queued':
+                            self.jobs[event['id']] = event['job']
+                        elif event['stage'] in ('done', 'failed'):
+                            self.jobs.pop(event['id'], None)
+                        elif event['id'] in self.jobs:
+                            self.jobs[event['id']]['stage'] = event['stage']
+                    except serializer.decode_errors + (KeyError,) as e:
+                        print(f"Skipping bad close job entry: {e}")
+        except FileNotFoundError:
+            pass
+        payload = b''.join(
+            serializer.dumps({'id': channel_id, 'stage': 'queued', 'job': job}, pretty=False) + b'\n'
+            for channel_id, job in self.jobs.items()
+        )
+        atomic_write(self.path, payload)
+
+    def _append(self, event):
+        if self.handle is None:
+            self.handle = open(self.path, 'ab')
+        self.handle.write(serializer.dumps(event, pretty=False) + b'\n')
+        self.handle.flush()
+        os.fsync(self.handle.fileno())
+
+    async def _journal(self, channel_id, stage, job=None):
+        event = {'id': channel_id, 'stage': stage}
+        if job is not None:
+            event['job'] = job
+        async with storage_lock('close_jobs'):
+            await run_io(self._append, event)
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        for channel_id in self.jobs:
+            self.queue.put_nowait(channel_id)
+        self.counts['resumed'] += len(self.jobs)
+        self.worker = asyncio.create_task(self._work())
+
+    async def stop(self):
+        for handle in self.retries.values():
+            handle.cancel()
+        if self.retries:
+            print(f"Leaving {len(self.retries)} ticket closes to retry at the next startup")
+        self.retries = {}
+        if self.worker:
+            self.worker.cancel()
+            self.worker = None
+        if self.handle:
+            await run_io(self.handle.close)
+            self.handle = None
+
+    def pending(self, channel_id):
+        return channel_id in self.jobs
+
+    async def submit(self, channel, ticket_data, closed_by):
+        """Journal a close and hand it to the worker; returns once the job is durable."""
+        job = {
+            'stage': 'counted' if ticket_data.get('close_counted') else None,
+            'attempts': 0,
+            'ticket': ticket_data,
+            'closed_by': closed_by,
+            'closer_id': ticket_data.get('claimed_by') or closed_by,
+            'channel_name': channel.name,
+            'category': channel.category.name if channel.category else 'Unknown',
+            'requested_at': time.time()
+        }
+        await self._journal(channel.id, 'queued', job)
+        self.jobs[channel.id] = job
+        self.counts['submitted'] += 1
+        self.queue.put_nowait(channel.id)
+
+    async def _work(self):
+        await bot.wait_until_ready()
+        while True:
+            channel_id = await self.queue.get()
+            job = self.jobs.get(channel_id)
+            if job is None:
+                continue
+            try:
+                await self._run(channel_id, job)
+            except Exception as e:
+                job['attempts'] = job.get('attempts', 0) + 1
+                print(f"Error closing ticket {channel_id} at stage {job['stage']} (attempt {job['attempts']}): {e}")
+                if job['attempts'] < CLOSE_MAX_ATTEMPTS:
+                    self.counts['retried'] += 1
+                    delay = CLOSE_RETRY_DELAY * 2 ** (job['attempts'] - 1)
+                    self.retries[channel_id] = asyncio.get_running_loop().call_later(delay, self._requeue, channel_id)
+                    continue
+                try:
+                    await self._release(channel_id, job)
+                except Exception as e:
+                    print(f"Error releasing ticket {channel_id}: {e}")
+
+    def _requeue(self, channel_id):
+        self.retries.pop(channel_id, None)
+        if self.queue is not None:
+            self.queue.put_nowait(channel_id)
+
+    async def _release(self, channel_id, job):
+        """Give up on a close and clear the ticket's closing flag so staff can close it again."""
+        self.jobs.pop(channel_id, None)
+        self.counts['failed'] += 1
+        await self._journal(channel_id, 'failed')
+        async with storage_lock('tickets'):
+            ticket_data = await storage.get_ticket(channel_id)
+            if ticket_data is not None:
+                ticket_data.pop('closing', None)
+                if job['stage'] not in (None, 'count'):
+                    ticket_data['close_counted'] = True
+                await storage.save_ticket(channel_id, ticket_data)
+        print(f"Gave up closing ticket #{job['channel_name']} after {job['attempts']} attempts")
+
+    async def _run(self, channel_id, job):
+        first = 0
+        if job['stage'] == 'counted':
+            first = CLOSE_STAGES.index('count') + 1
+        elif job['stage']:
+            first = CLOSE_STAGES.index(job['stage'])
+        timings = []
+        for stage in CLOSE_STAGES[first:]:
+            await self._journal(channel_id, stage)
+            job['stage'] = stage
+            start = time.perf_counter()
+            await getattr(self, f'_stage_{stage}')(channel_id, job)
+            elapsed = time.perf_counter() - start
+            self.stage_times[stage][0] += elapsed
+            self.stage_times[stage][1] += 1
+            timings.append(f"{stage} {elapsed:.2f}s")
+            if stage == 'count':
+                await self._journal(channel_id, 'counted')
+                job['stage'] = 'counted'
+        await state_store.flush_async()
+        await self._journal(channel_id, 'done')
+        del self.jobs[channel_id]
+        self.counts['completed'] += 1
+        print(f"Closed ticket #{job['channel_name']}: {', '.join(timings)}")
+
+    async def _stage_count(self, channel_id, job):
+        await storage.add_count('tickets', job['closer_id'], 1)
+
+    async def _stage_transcript(self, channel_id, job):
+        channel = bot.get_channel(channel_id)
+        transcript_file = await ticket_capture.transcript(channel) if channel else None
+        logs_channel = bot.get_channel(TICKET_LOGS_CHANNEL_ID)
+        if logs_channel:
+            log_embed = discord.Embed(
+                title="🎫 Ticket Closed",
+                color=0xff0000,
+                timestamp=datetime.datetime.now()
+            )
+            log_embed.add_field(name="Ticket Type", value=job['category'], inline=True)
+            log_embed.add_field(name="Category", value=job['category'], inline=True)
+            log_embed.add_field(name="Closed By", value=f"<@{job['closed_by']}>", inline=True)
+            log_embed.add_field(name="Channel", value=job['channel_name'], inline=True)
+
+            if not await log_sink.post(logs_channel, log_embed, transcript_file, priority=True):
+                raise RuntimeError("ticket log was not delivered")
+        elif transcript_file:
+            transcript_file.close()
+
+    async def _stage_archive(self, channel_id, job):
+        if await storage.get_ticket(channel_id) is not None:
+            await archive_ticket(channel_id, job['ticket'], job['closed_by'])
+        await state_store.flush_async()
+
+    async def _stage_delete(self, channel_id, job):
+        delay = job['requested_at'] + CLOSE_DELETE_DELAY - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        channel = bot.get_channel(channel_id)
+        if channel:
+            try:
+                await outbound.run(PRIORITY_INTERACTION, ('channels', channel.guild.id), channel.delete)
+            except discord.NotFound:
+                pass
+
+    def stats(self):
+        return dict(
+            self.counts,
+            pending=len(self.jobs),
+            stage_avg={stage: round(total / n, 3) for stage, (total, n) in self.stage_times.items() if n}
+        )
+
+close_jobs = CloseJobQueue(CLOSE_JOBS_FILE)
+DIAGNOSTICS['close_jobs'] = close_jobs.stats
+
+async def backfill_ticket_logs():
+    """Capture messages sent to open tickets while the bot was offline."""
+    ticket_capture.synced.clear()
+    for channel_id in await storage.active_ticket_ids():
+        channel = bot.get_channel(channel_id)
+        if channel:
+            try:
+                await ticket_capture.fill_gap(channel)
+            except Exception as e:
+                print(f"Error backfilling ticket log for {channel_id}: {e}")
+
+async def archive_deleted_tickets():
+    """Archive active tickets whose channel no longer exists (closed before the archive existed)."""
+    if not bot.guilds or any(guild.unavailable for guild in bot.guilds):
+        return
+    stale = [
+        channel_id for channel_id in await storage.active_ticket_ids()
+        if bot.get_channel(channel_id) is None and not close_jobs.pending(channel_id)
+    ]
+    for channel_id in stale:
+        ticket_data = await storage.get_ticket(channel_id)
+        if ticket_data:
+            await archive_ticket(channel_id, ticket_data, ticket_data.get('claimed_by'))
+    if stale:
+        print(f"Archived {len(stale)} tickets for deleted channels")
+
+HTTP_TIMEOUT = 10  # seconds for a whole request, including reading the body
+HTTP_CONNECT_TIMEOUT = 5  # seconds to open a connection
+HTTP_POOL_LIMIT = 20  # open connections across all hosts
+HTTP_HOST_LIMIT = 4  # open connections per host
+HTTP_DNS_TTL = 300  # seconds to cache DNS lookups
+
+class HttpClient:
+    """
+    One long-lived aiohttp session shared by every outbound web call, so connections,
+    DNS lookups and TLS sessions are reused. Requests get default timeouts, and latency
+    and errors are counted per endpoint name (the host unless one is given).
+    """
+    def __init__(self):
+        self.session = None
+        self.endpoints = {}
+
+    def _session(self):
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                limit_per_host=HTTP_HOST_LIMIT,
+                ttl_dns_cache=HTTP_DNS_TTL
+            )
+            timeout = aiohttp.ClientTimeout(total=HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self.session
+
+    @contextlib.asynccontextmanager
+    async def request(self, method, url, endpoint=None, **kwargs):
+        counters = self.endpoints.setdefault(
+            endpoint or urllib.parse.urlsplit(url).hostname,
+            {'requests': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0}
+        )
+        counters['requests'] += 1
+        start = time.perf_counter()
+        try:
+            async with self._session().request(method, url, **kwargs) as response:
+                if response.status >= 500:
+                    counters['errors'] += 1
+                yield response
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            counters['errors'] += 1
+            raise
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            counters['total_ms'] += elapsed
+            counters['max_ms'] = max(counters['max_ms'], elapsed)
+
+    def get(self, url, endpoint=None, **kwargs):
+        return self.request('GET', url, endpoint, **kwargs)
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def stats(self):
+        return {
+            endpoint: dict(
+                requests=c['requests'],
+                errors=c['errors'],
+                avg_ms=round(c['total_ms'] / c['requests'], 1),
+                max_ms=round(c['max_ms'], 1)
+            )
+            for endpoint, c in self.endpoints.items()
+        }
+
+http_client = HttpClient()
+DIAGNOSTICS['http'] = http_client.stats
+
+MOJANG_API_URL = 'https://api.mojang.com'
+MOJANG_CACHE_FILE = 'mojang_cache.json'
+MOJANG_CACHE_SIZE = 5000  # usernames kept, least recently used evicted first
+MOJANG_CACHE_TTL = 24 * 60 * 60  # seconds to trust a resolved UUID
+MOJANG_NEGATIVE_TTL = 60 * 60  # seconds to remember that a username does not exist
+MOJANG_BATCH_DELAY = 0.05  # seconds to collect concurrent lookups into one bulk request
+MOJANG_BATCH_SIZE = 10  # Mojang's limit of names per bulk request
+
+state_store.register(MOJANG_CACHE_FILE, lambda: {'profiles': {}})
+
+class MojangProfileCache:
+    """
+    Username -> UUID cache in front of the Mojang API, persisted in MOJANG_CACHE_FILE.
+    Entries are LRU-ordered with a TTL; unknown names are cached as None for
+    MOJANG_NEGATIVE_TTL. Concurrent lookups of one name share a request, and lookups
+    arriving within MOJANG_BATCH_DELAY of each other go out as one bulk request.
+    Failed requests are not cached.
+    """
+    def __init__(self, base_url, path):
+        self.base_url = base_url
+        self.path = path
+        self.entries = {}
+        self.inflight = {}
+        self.pending = []
+        self.flush_handle = None
+        self.counts = {'hits': 0, 'negative_hits': 0, 'misses': 0, 'coalesced': 0, 'requests': 0, 'bulk_requests': 0, 'errors': 0}
+
+    def load(self):
+        now = time.time()
+        profiles = state_store.get(self.path)['profiles']
+        self.entries = {name: entry for name, entry in profiles.items() if entry[1] > now}
+
+    def _save(self):
+        state_store.set(self.path, {'profiles': self.entries})
+
+    def _store(self, name, uuid, now):
+        self.entries.pop(name, None)
+        self.entries[name] = [uuid, now + (MOJANG_CACHE_TTL if uuid else MOJANG_NEGATIVE_TTL)]
+        while len(self.entries) > MOJANG_CACHE_SIZE:
+            del self.entries[next(iter(self.entries))]
+
+    async def lookup(self, username):
+        """Return the UUID for a username, or None if it does not exist or Mojang is unreachable."""
+        name = username.lower()
+        if not (0 < len(name) <= 16 and name.isascii() and name.replace('_', '').isalnum()):
+            return None
+        entry = self.entries.get(name)
+        if entry and entry[1] > time.time():
+            self.entries[name] = self.entries.pop(name)
+            self.counts['hits' if entry[0] else 'negative_hits'] += 1
+            return entry[0]
+        future = self.inflight.get(name)
+        if future is not None:
+            self.counts['coalesced'] += 1
+        else:
+            self.counts['misses'] += 1
+            future = self.inflight[name] = asyncio.get_running_loop().create_future()
+            self.pending.append(name)
+            if len(self.pending) >= MOJANG_BATCH_SIZE:
+                self._start_flush()
+            elif self.flush_handle is None:
+                self.flush_handle = asyncio.get_running_loop().call_later(MOJANG_BATCH_DELAY, self._start_flush)
+        return await asyncio.shield(future)
+
+    async def lookup_many(self, usernames):
+        uuids = await asyncio.gather(*(self.lookup(username) for username in usernames))
+        return dict(zip(usernames, uuids))
+
+    def _start_flush(self):
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+        names, self.pending = self.pending[:MOJANG_BATCH_SIZE], self.pending[MOJANG_BATCH_SIZE:]
+        if self.pending:
+            self.flush_handle = asyncio.get_running_loop().call_later(MOJANG_BATCH_DELAY, self._start_flush)
+        asyncio.create_task(self._resolve(names))
+
+    async def _fetch(self, names):
+        """Return {name: uuid or None} for names Mojang answered for; raises on failure."""
+        if len(names) == 1:
+            self.counts['requests'] += 1
+            async with http_client.get(f'{self.base_url}/users/profiles/minecraft/{names[0]}', 'mojang') as resp:
                 if resp.status == 200:
-                    data = await resp.json()
-                    uuid = data['id']
-                    return f'https://minotar.net/avatar/{uuid}/64'
-                else:
-                    return 'https://minotar.net/avatar/steve/64'
-    except:
-        return 'https://minotar.net/avatar/steve/64'
+                    return {names[0]: (await resp.json())['id']}
+                if resp.status in (204, 404):
+                    return {names[0]: None}
+                raise aiohttp.ClientResponseError(resp.request_info, resp.history, status=resp.status)
+        self.counts['bulk_requests'] += 1
+        async with http_client.request('POST', f'{self.base_url}/profiles/minecraft', 'mojang_bulk', json=names) as resp:
+            resp.raise_for_status()
+            found = {profile['name'].lower(): profile['id'] for profile in await resp.json()}
+        return {name: found.get(name) for name in names}
+
+    async def _resolve(self, names):
+        try:
+            results = await self._fetch(names)
+            now = time.time()
+            for name, uuid in results.items():
+                self._store(name, uuid, now)
+            self._save()
+        except Exception as e:
+            self.counts['errors'] += 1
+            print(f"Error looking up Minecraft profiles {', '.join(names)}: {e}")
+            results = {}
+        for name in names:
+            future = self.inflight.pop(name)
+            if not future.done():
+                future.set_result(results.get(name))
+
+    def stats(self):
+        return dict(self.counts, cached=len(self.entries), inflight=len(self.inflight))
+
+mojang_profiles = MojangProfileCache(MOJANG_API_URL, MOJANG_CACHE_FILE)
+DIAGNOSTICS['mojang'] = mojang_profiles.stats
+
+async def get_minecraft_head_url(username):
+    uuid = await mojang_profiles.lookup(username)
+    return f'https://minotar.net/avatar/{uuid or "steve"}/64'
 
 class TicketView(discord.ui.View):
     def __init__(self):
@@ -243,18 +2119,22 @@ class TicketModal(discord.ui.Modal):
             return
         
         channel_name = f"{self.ticket_type.lower().replace(' ', '-')}-{interaction.user.name}"
+        ticket_record = {
+            'user_id': interaction.user.id,
+            'username': self.username.value,
+            'type': self.ticket_type,
+            'category': category.name,
+            'created_at': datetime.datetime.now().isoformat(),
+            'last_activity': datetime.datetime.now().isoformat(),
+            'claimed_by': None,
+            'warning_sent': False
+        }
         
-        ticket_channel = await guild.create_text_channel(
+        ticket_channel = await outbound.run(
+            PRIORITY_INTERACTION, ('channels', guild.id), guild.create_text_channel,
             name=channel_name,
             category=category,
-            overwrites={
-                guild.default_role: discord.PermissionOverwrite(read_messages=False),
-                interaction.user: discord.PermissionOverwrite(read_messages=True, send_messages=True),
-                guild.get_role(TRIAL_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True),
-                guild.get_role(HELPER_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True),
-                guild.get_role(MOD_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True),
-                guild.get_role(TICKET_ADMIN_ROLE_ID): discord.PermissionOverwrite(read_messages=True, send_messages=True)
-            }
+            overwrites=plan_ticket_overwrites(guild, ticket_record)
         )
 
         head_url = await get_minecraft_head_url(self.username.value)
@@ -276,18 +2156,7 @@ class TicketModal(discord.ui.Modal):
         
         await ticket_channel.send(f"{interaction.user.mention}", embed=embed, view=claim_view)
         
-        data = load_data()
-        data['tickets'][str(ticket_channel.id)] = {
-            'user_id': interaction.user.id,
-            'username': self.username.value,
-            'type': self.ticket_type,
-            'category': category.name,
-            'created_at': datetime.datetime.now().isoformat(),
-            'last_activity': datetime.datetime.now().isoformat(),
-            'claimed_by': None,
-            'warning_sent': False
-        }
-        save_data(data)
+        await storage.save_ticket(ticket_channel.id, ticket_record)
         
         await interaction.response.send_message(f"Ticket created! {ticket_channel.mention}", ephemeral=True)
 
@@ -301,50 +2170,28 @@ class ClaimView(discord.ui.View):
             await interaction.response.send_message("You don't have permission to claim tickets!", ephemeral=True)
             return
         
-        data = load_data()
-        channel_id = str(interaction.channel.id)
-        
-        if channel_id not in data['tickets']:
-
-            data['tickets'][channel_id] = {
-                'user_id': interaction.channel.topic.split('|')[0] if interaction.channel.topic else None,
-                'username': 'Unknown',
-                'type': interaction.channel.category.name if interaction.channel.category else 'Unknown',
-                'category': interaction.channel.category.name if interaction.channel.category else 'Unknown',
-                'created_at': datetime.datetime.now().isoformat(),
-                'last_activity': datetime.datetime.now().isoformat(),
-                'claimed_by': None,
-                'warning_sent': False
-            }
-            save_data(data)
+        async with storage_lock('tickets'):
+            ticket_data = await storage.get_ticket(interaction.channel.id)
+            
+            if ticket_data is None:
+                ticket_data = untracked_ticket_record(interaction.channel)
+            
+            claimed_by = ticket_data['claimed_by']
+            if not claimed_by:
+                ticket_data['claimed_by'] = interaction.user.id
+                ticket_data['last_activity'] = datetime.datetime.now().isoformat()  
+                await storage.save_ticket(interaction.channel.id, ticket_data)
         
-        if data['tickets'][channel_id]['claimed_by']:
+        if claimed_by:
             if has_ticket_admin_permissions(interaction.user):
-                claimer = interaction.guild.get_member(data['tickets'][channel_id]['claimed_by'])
+                claimer = interaction.guild.get_member(claimed_by)
                 claimer_mention = claimer.mention if claimer else "Unknown User"
                 await interaction.response.send_message(f"This ticket is already claimed by {claimer_mention}", ephemeral=True)
             else:
                 await interaction.response.send_message("This ticket is already claimed!", ephemeral=True)
             return
         
-        data['tickets'][channel_id]['claimed_by'] = interaction.user.id
-        data['tickets'][channel_id]['last_activity'] = datetime.datetime.now().isoformat()  
-        save_data(data)
-        
-        ticket_data = data['tickets'][channel_id]
-        ticket_creator = interaction.guild.get_member(ticket_data['user_id'])
-        claimer = interaction.guild.get_member(interaction.user.id)
-        
-        await interaction.channel.set_permissions(interaction.guild.default_role, read_messages=False)
-        await interaction.channel.set_permissions(interaction.guild.get_role(TRIAL_ROLE_ID), read_messages=False, send_messages=False)
-        await interaction.channel.set_permissions(interaction.guild.get_role(HELPER_ROLE_ID), read_messages=False, send_messages=False)
-        await interaction.channel.set_permissions(interaction.guild.get_role(MOD_ROLE_ID), read_messages=False, send_messages=False)
-        
-        await interaction.channel.set_permissions(interaction.guild.get_role(TICKET_ADMIN_ROLE_ID), read_messages=True, send_messages=True)
-        if ticket_creator:
-            await interaction.channel.set_permissions(ticket_creator, read_messages=True, send_messages=True)
-        if claimer:
-            await interaction.channel.set_permissions(claimer, read_messages=True, send_messages=True)
+        await sync_ticket_permissions(interaction.channel)
         
         embed = discord.Embed(
             title="🎫 Ticket Claimed",
@@ -364,56 +2211,18 @@ class ClaimView(discord.ui.View):
             await interaction.response.send_message("You don't have permission to close tickets!", ephemeral=True)
             return
 
-        data = load_data()
-        channel_id = str(interaction.channel.id)
+        ticket_data, already_closing = await mark_ticket_closing(interaction.channel)
         
-        if channel_id not in data['tickets']:
+        if ticket_data is None:
             await interaction.response.send_message("This ticket doesn't exist in the database!", ephemeral=True)
             return
-
-        messages = []
-        async for message in interaction.channel.history(limit=None, oldest_first=True):
-            messages.append(f"{message.author.name}: {message.content}")
         
-        transcript = "\n".join(messages)
-        
-        ticket_data = data['tickets'][channel_id]
-        ticket_counts = load_ticket_counts()
-        
-        if ticket_data.get('claimed_by'):
-            closer_id = str(ticket_data['claimed_by'])
-            if closer_id not in ticket_counts['user_ticket_counts']:
-                ticket_counts['user_ticket_counts'][closer_id] = 0
-            ticket_counts['user_ticket_counts'][closer_id] += 1
-            save_ticket_counts(ticket_counts)
-        else:
-            closer_id = str(interaction.user.id)
-            if closer_id not in ticket_counts['user_ticket_counts']:
-                ticket_counts['user_ticket_counts'][closer_id] = 0
-            ticket_counts['user_ticket_counts'][closer_id] += 1
-            save_ticket_counts(ticket_counts)
+        if already_closing:
+            await interaction.response.send_message("This ticket is already being closed!", ephemeral=True)
+            return
 
-        logs_channel = bot.get_channel(TICKET_LOGS_CHANNEL_ID)
-        if logs_channel:
-            log_embed = discord.Embed(
-                title="🎫 Ticket Closed",
-                color=0xff0000,
-                timestamp=datetime.datetime.now()
-            )
-            log_embed.add_field(name="Ticket Type", value=interaction.channel.category.name, inline=True)
-            log_embed.add_field(name="Category", value=interaction.channel.category.name, inline=True)
-            log_embed.add_field(name="Closed By", value=interaction.user.mention, inline=True)
-            log_embed.add_field(name="Channel", value=interaction.channel.name, inline=True)
-            
-            transcript_file = discord.File(
-                io.StringIO(transcript),
-                filename=f"transcript-{interaction.channel.name}.txt"
-            )
-            await logs_channel.send(embed=log_embed, file=transcript_file)
-        
-        await interaction.response.send_message("Ticket will be deleted in 5 seconds...")
-        await asyncio.sleep(5)
-        await interaction.channel.delete()
+        await close_jobs.submit(interaction.channel, ticket_data, interaction.user.id)
+        await interaction.response.send_message(f"Ticket will be deleted in {CLOSE_DELETE_DELAY} seconds...")
 
     @discord.ui.button(label="Unclaim Ticket", style=discord.ButtonStyle.gray, emoji="🔄")
     async def unclaim_ticket(self, interaction: discord.Interaction, button: discord.ui.Button):
@@ -421,32 +2230,24 @@ class ClaimView(discord.ui.View):
             await interaction.response.send_message("You don't have permission to unclaim tickets!", ephemeral=True)
             return
         
-        data = load_data()
-        channel_id = str(interaction.channel.id)
+        async with storage_lock('tickets'):
+            ticket_data = await storage.get_ticket(interaction.channel.id)
+            
+            was_claimed = bool(ticket_data and ticket_data['claimed_by'])
+            if was_claimed:
+                ticket_data['claimed_by'] = None
+                ticket_data['last_activity'] = datetime.datetime.now().isoformat()
+                await storage.save_ticket(interaction.channel.id, ticket_data)
         
-        if channel_id not in data['tickets']:
+        if ticket_data is None:
             await interaction.response.send_message("This ticket doesn't exist in the database!", ephemeral=True)
             return
         
-        if not data['tickets'][channel_id]['claimed_by']:
+        if not was_claimed:
             await interaction.response.send_message("This ticket is not claimed!", ephemeral=True)
             return
         
-        data['tickets'][channel_id]['claimed_by'] = None
-        data['tickets'][channel_id]['last_activity'] = datetime.datetime.now().isoformat()
-        save_data(data)
-        
-        ticket_data = data['tickets'][channel_id]
-        ticket_creator = interaction.guild.get_member(ticket_data['user_id'])
-        
-        await interaction.channel.set_permissions(interaction.guild.default_role, read_messages=False)
-        await interaction.channel.set_permissions(interaction.guild.get_role(TRIAL_ROLE_ID), read_messages=True, send_messages=True)
-        await interaction.channel.set_permissions(interaction.guild.get_role(HELPER_ROLE_ID), read_messages=True, send_messages=True)
-        await interaction.channel.set_permissions(interaction.guild.get_role(MOD_ROLE_ID), read_messages=True, send_messages=True)
-        await interaction.channel.set_permissions(interaction.guild.get_role(TICKET_ADMIN_ROLE_ID), read_messages=True, send_messages=True)
-        
-        if ticket_creator:
-            await interaction.channel.set_permissions(ticket_creator, read_messages=True, send_messages=True)
+        await sync_ticket_permissions(interaction.channel)
         
         embed = discord.Embed(
             title="🎫 Ticket Unclaimed",
@@ -457,164 +2258,449 @@ class ClaimView(discord.ui.View):
         await interaction.response.edit_message(view=self)
         await interaction.followup.send(embed=embed)
 
-@tasks.loop(seconds=10)
-async def update_server_status():
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f'https://api.mcsrvstat.us/3/{MC_SERVER_IP}') as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    if data.get('online', False):
-                        embed = discord.Embed(
-                            title="🟢 Server Online",
-                            color=0x00ff00,
-                            timestamp=datetime.datetime.now()
-                        )
-                        
-                        players = data.get('players', {})
-                        online = players.get('online', 0)
-                        max_players = players.get('max', 0)
-                        version = data.get('version', 'Unknown')
-                        
-                        embed.add_field(name="Players Online", value=f"{online}/{max_players}", inline=True)
-                        embed.add_field(name="Version", value=version, inline=True)
-                        embed.add_field(name="Server IP", value=MC_SERVER_IP, inline=True)
-                        embed.add_field(name="Port", value=str(MC_SERVER_PORT), inline=True)
-                        embed.set_thumbnail(url=STATUS_IMAGE_1)
-                        embed.set_image(url=BANNER_IMAGE)
-                        
-                        bot.server_status_embed = embed
-                        print(f"Server status updated: Online - {online}/{max_players} players")
-                        
-                        await bot.change_presence(
-                            activity=discord.Activity(
-                                type=discord.ActivityType.playing,
-                                name=f"👥 {online}/{max_players}"
-                            )
-                        )
-                        return
-                    
+MC_STATUS_TARGETS = [('bedrock', MC_SERVER_IP, MC_SERVER_PORT)]  # (edition, host, port) probed concurrently; the first online one is shown
+MC_PROBE_TIMEOUT = 3  # seconds per direct ping
+MC_STATUS_API_URL = 'https://api.mcsrvstat.us'  # HTTP fallback when no direct ping answers, None to disable
+
+class StatusProbe:
+    """
+    Queries Minecraft servers directly with mcstatus (Bedrock over UDP, Java over TCP).
+    All targets are pinged concurrently and the first online one in target order wins,
+    so a crossplay server can list its Bedrock and Java ports. If no ping answers
+    (or mcstatus is not installed) the mcsrvstat.us HTTP API is asked about the first target.
+    """
+    def __init__(self, targets, timeout, api_url=None):
+        self.targets = targets
+        self.timeout = timeout
+        self.api_url = api_url
+        self.counts = {'direct': 0, 'http': 0, 'unreachable': 0}
+
+    async def _ping(self, edition, host, port):
+        server_class = mcstatus.BedrockServer if edition == 'bedrock' else mcstatus.JavaServer
+        server = server_class(host, port, timeout=self.timeout)
+        status = await asyncio.wait_for(server.async_status(tries=1), self.timeout * 2)
+        return {
+            'online': True,
+            'players': status.players.online,
+            'max_players': status.players.max,
+            'version': status.version.name,
+            'latency': round(status.latency, 1)
+        }
+
+    async def _ping_http(self, edition, host, port):
+        path = f'bedrock/3/{host}:{port}' if edition == 'bedrock' else f'3/{host}:{port}'
+        async with http_client.get(f'{self.api_url}/{path}', 'mcsrvstat') as response:
+            response.raise_for_status()
+            data = await response.json()
+        if not data.get('online', False):
+            return None
+        players = data.get('players', {})
+        return {
+            'online': True,
+            'players': players.get('online', 0),
+            'max_players': players.get('max', 0),
+            'version': data.get('version', 'Unknown'),
+            'latency': None
+        }
+
+    async def probe(self):
+        """Return a status snapshot; offline when nothing answers."""
+        snapshot = {'online': False, 'players': 0, 'max_players': 0, 'version': 'Unknown', 'latency': None, 'source': None}
+        host, port = self.targets[0][1:]
+        if mcstatus is not None:
+            results = await asyncio.gather(*(self._ping(*target) for target in self.targets), return_exceptions=True)
+            for (edition, target_host, target_port), result in zip(self.targets, results):
+                if not isinstance(result, BaseException):
+                    self.counts['direct'] += 1
+                    snapshot.update(result, source=edition)
+                    host, port = target_host, target_port
+                    break
+        if not snapshot['online'] and self.api_url:
+            try:
+                result = await self._ping_http(*self.targets[0])
+                if result:
+                    self.counts['http'] += 1
+                    snapshot.update(result, source='http')
+            except Exception as e:
+                print(f"Error checking server status over HTTP: {e}")
+        if not snapshot['online']:
+            self.counts['unreachable'] += 1
+        snapshot.update(host=host, port=port, checked_at=time.time())
+        return snapshot
+
+status_probe = StatusProbe(MC_STATUS_TARGETS, MC_PROBE_TIMEOUT, MC_STATUS_API_URL)
+
+STATUS_POLL_MIN = 10  # seconds between polls while the player count is changing
+STATUS_POLL_MAX = 120  # seconds between polls once the count is stable or the server is offline
+STATUS_POLL_BACKOFF = 2  # interval multiplier for each poll that changes nothing
+STATUS_POLL_JITTER = 0.1  # +/- fraction applied to every interval
+STATUS_FRESH_FOR = 15  # seconds a status snapshot is served without triggering a refresh
+
+class ServerStatusCache:
+    """
+    Latest server status snapshot, shared by the status loop and /status.
+    Readers always get the cached snapshot at once (stale-while-revalidate); a stale
+    snapshot triggers one background refresh no matter how many readers see it.
+    Only the very first read, before any snapshot exists, waits for the upstream API.
+    """
+    def __init__(self, probe, fresh_for):
+        self.probe = probe
+        self.fresh_for = fresh_for
+        self.snapshot = None
+        self.fetched_at = None
+        self.last_success = None  # wall-clock time of the last probe that did not fail
+        self.refreshing = None
+        self.counts = {'fetches': 0, 'errors': 0, 'fresh_reads': 0, 'stale_reads': 0}
+
+    async def _fetch(self):
+        self.counts['fetches'] += 1
+        try:
+            snapshot = await self.probe.probe()
+            self.last_success = snapshot['checked_at']
+        except Exception as e:
+            self.counts['errors'] += 1
+            print(f"Error checking server status: {e}")
+            edition, host, port = self.probe.targets[0]
+            snapshot = {'online': False, 'players': 0, 'max_players': 0, 'version': 'Unknown', 'latency': None,
+                        'source': None, 'host': host, 'port': port, 'checked_at': time.time()}
+        self.snapshot = snapshot
+        self.fetched_at = time.monotonic()
+        return snapshot
+
+    async def _run_refresh(self):
+        try:
+            return await self._fetch()
+        finally:
+            self.refreshing = None
+
+    def refresh(self):
+        """Start a refresh unless one is already running; returns the task to await."""
+        if self.refreshing is None:
+            self.refreshing = asyncio.create_task(self._run_refresh())
+        return self.refreshing
+
+    def is_fresh(self):
+        return self.fetched_at is not None and time.monotonic() - self.fetched_at < self.fresh_for
+
+    async def get(self):
+        if self.snapshot is None:
+            return await self.refresh()
+        if self.is_fresh():
+            self.counts['fresh_reads'] += 1
+        else:
+            self.counts['stale_reads'] += 1
+            self.refresh()
+        return self.snapshot
+
+    def stats(self):
+        age = round(time.monotonic() - self.fetched_at, 1) if self.fetched_at is not None else None
+        return dict(self.counts, age=age)
+
+server_status_cache = ServerStatusCache(status_probe, STATUS_FRESH_FOR)
+DIAGNOSTICS['status_cache'] = server_status_cache.stats
+
+def status_embed(snapshot):
+    checked_at = datetime.datetime.fromtimestamp(snapshot['checked_at'])
+    if snapshot['online']:
         embed = discord.Embed(
-            title="🔴 Server Offline",
-            color=0xff0000,
-            timestamp=datetime.datetime.now()
-        )
-        embed.add_field(name="Server IP", value=MC_SERVER_IP, inline=True)
-        embed.add_field(name="Port", value=str(MC_SERVER_PORT), inline=True)
-        embed.set_thumbnail(url=STATUS_IMAGE_1)
-        embed.set_image(url=BANNER_IMAGE)
-        
-        bot.server_status_embed = embed
-        
-        await bot.change_presence(
-            activity=discord.Activity(
-                type=discord.ActivityType.playing,
-                name="🔴 Offline"
-            )
+            title="🟢 Server Online",
+            color=0x00ff00,
+            timestamp=checked_at
         )
-        
-    except Exception as e:
-        print(f"Error checking server status: {e}")
+        embed.add_field(name="Players Online", value=f"{snapshot['players']}/{snapshot['max_players']}", inline=True)
+        embed.add_field(name="Version", value=snapshot['version'], inline=True)
+        if snapshot['latency'] is not None:
+            embed.add_field(name="Ping", value=f"{snapshot['latency']:.0f} ms", inline=True)
+    else:
         embed = discord.Embed(
             title="🔴 Server Offline",
             color=0xff0000,
-            timestamp=datetime.datetime.now()
+            timestamp=checked_at
         )
-        embed.add_field(name="Server IP", value=MC_SERVER_IP, inline=True)
-        embed.add_field(name="Port", value=str(MC_SERVER_PORT), inline=True)
-        embed.set_thumbnail(url=STATUS_IMAGE_1)
-        embed.set_image(url=BANNER_IMAGE)
-        
-        bot.server_status_embed = embed
-        
-        await bot.change_presence(
-            activity=discord.Activity(
-                type=discord.ActivityType.playing,
-                name="🔴 Offline"
-            )
+    embed.add_field(name="Server IP", value=snapshot['host'], inline=True)
+    embed.add_field(name="Port", value=str(snapshot['port']), inline=True)
+    embed.set_thumbnail(url=STATUS_IMAGE_1)
+    embed.set_image(url=BANNER_IMAGE)
+    embed.set_footer(text="Last checked")
+    return embed
+
+def status_display(snapshot):
+    """The parts of a snapshot that are shown to users; latency and check time are left out."""
+    return (snapshot['online'], snapshot['players'], snapshot['max_players'], snapshot['version'], snapshot['host'], snapshot['port'])
+
+def status_presence(snapshot):
+    return f"👥 {snapshot['players']}/{snapshot['max_players']}" if snapshot['online'] else "🔴 Offline"
+
+class StatusPoller:
+    """
+    Adaptive status polling. The interval drops to STATUS_POLL_MIN whenever the displayed
+    status changes and backs off towards STATUS_POLL_MAX while it stays the same (including
+    while offline), with jitter. Presence and the status embed are only rebuilt on change.
+    """
+    def __init__(self, cache):
+        self.cache = cache
+        self.interval = STATUS_POLL_MIN
+        self.display = None
+        self.presence = None
+        self.embed_display = None
+        self.embed = None
+        self.counts = {'polls': 0, 'changes': 0, 'presence_updates': 0, 'presence_skipped': 0}
+
+    def embed_for(self, snapshot):
+        """The status embed, rebuilt only when a displayed field changed and stamped with the last successful check."""
+        display = status_display(snapshot)
+        if display != self.embed_display:
+            self.embed = status_embed(snapshot)
+            self.embed_display = display
+        self.embed.timestamp = datetime.datetime.fromtimestamp(self.cache.last_success or snapshot['checked_at'])
+        return self.embed
+
+    async def show(self, presence):
+        """Set the bot's presence unless it already shows this text."""
+        if presence == self.presence:
+            self.counts['presence_skipped'] += 1
+            return
+        await set_presence(presence)
+        self.presence = presence
+        self.counts['presence_updates'] += 1
+
+    async def poll(self):
+        """Refresh the status, apply any change and return the seconds until the next poll."""
+        snapshot = await self.cache.refresh()
+        self.counts['polls'] += 1
+        player_history.record(snapshot['checked_at'], snapshot['players'] if snapshot['online'] else 0)
+        display = status_display(snapshot)
+        if display != self.display:
+            self.display = display
+            self.counts['changes'] += 1
+            self.interval = STATUS_POLL_MIN
+            self.embed_for(snapshot)
+            if snapshot['online']:
+                print(f"Server status updated: Online - {snapshot['players']}/{snapshot['max_players']} players")
+        else:
+            self.interval = min(self.interval * STATUS_POLL_BACKOFF, STATUS_POLL_MAX)
+        await self.show(status_presence(snapshot))
+        return self.interval * random.uniform(1 - STATUS_POLL_JITTER, 1 + STATUS_POLL_JITTER)
+
+    def stats(self):
+        return dict(self.counts, interval=self.interval)
+
+status_poller = StatusPoller(server_status_cache)
+DIAGNOSTICS['status_poller'] = status_poller.stats
+
+PLAYER_HISTORY_FILE = 'player_history.bin'
+PLAYER_HISTORY_TIERS = (  # (name, bucket seconds, buckets kept); bucket 0 keeps every sample
+    ('raw', 0, 8640),
+    ('minute', 60, 7 * 24 * 60),
+    ('hour', 60 * 60, 90 * 24)
+)
+PLAYER_HISTORY_VIEWS = {  # /status history option -> (tier, seconds covered)
+    '24h': ('minute', 24 * 60 * 60),
+    '7d': ('hour', 7 * 24 * 60 * 60),
+    '30d': ('hour', 30 * 24 * 60 * 60)
+}
+PLAYER_HISTORY_FLUSH_INTERVAL = 5  # minutes
+SPARKLINE_WIDTH = 24
+SPARKLINE_BARS = '▁▂▃▄▅▆▇█'
+
+class RingSeries:
+    """
+    Fixed-size ring of (bucket start, peak, total, count) rows in typed arrays.
+    Samples falling in the newest bucket are merged into it; a new bucket overwrites the oldest.
+    """
+    def __init__(self, bucket, capacity):
+        self.bucket = bucket
+        self.capacity = capacity
+        self.start = array.array('q', bytes(8 * capacity))
+        self.peak = array.array('i', bytes(4 * capacity))
+        self.total = array.array('q', bytes(8 * capacity))
+        self.count = array.array('i', bytes(4 * capacity))
+        self.head = 0
+        self.size = 0
+
+    def append(self, start, peak, total, count):
+        i = self.head
+        self.start[i], self.peak[i], self.total[i], self.count[i] = start, peak, total, count
+        self.head = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+
+    def add(self, timestamp, value):
+        start = timestamp - timestamp % self.bucket if self.bucket else timestamp
+        if self.size:
+            last = (self.head - 1) % self.capacity
+            if self.start[last] == start:
+                self.peak[last] = max(self.peak[last], value)
+                self.total[last] += value
+                self.count[last] += 1
+                return
+        self.append(start, value, value, 1)
+
+    def rows(self, since=None):
+        """Rows oldest first, walking back from the newest only as far as since."""
+        rows = []
+        for k in range(self.size):
+            i = (self.head - 1 - k) % self.capacity
+            if since is not None and self.start[i] < since:
+                break
+            rows.append((self.start[i], self.peak[i], self.total[i], self.count[i]))
+        rows.reverse()
+        return rows
+
+class PlayerHistory:
+    """
+    Player counts from the status poller, kept at several resolutions (see PLAYER_HISTORY_TIERS)
+    and saved to PLAYER_HISTORY_FILE as little-endian arrays. History views read a
+    downsampled tier, so they never scan raw samples.
+    """
+    MAGIC = b'EPH1'
+
+    def __init__(self, path, tiers):
+        self.path = path
+        self.tiers = {name: RingSeries(bucket, capacity) for name, bucket, capacity in tiers}
+        self.dirty = False
+
+    def record(self, timestamp, online):
+        for series in self.tiers.values():
+            series.add(int(timestamp), online)
+        self.dirty = True
+
+    def _encode(self):
+        parts = [struct.pack('<4sH', self.MAGIC, len(self.tiers))]
+        for name, series in self.tiers.items():
+            rows = series.rows()
+            parts.append(struct.pack('<8sqI', name.encode(), series.bucket, len(rows)))
+            for index, typecode in enumerate('qiqi'):
+                column = array.array(typecode, (row[index] for row in rows))
+                if sys.byteorder == 'big':
+                    column.byteswap()
+                parts.append(column.tobytes())
+        return b''.join(parts)
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        try:
+            magic, tier_count = struct.unpack_from('<4sH', data)
+            if magic != self.MAGIC:
+                raise ValueError(f"bad magic {magic!r}")
+            offset = struct.calcsize('<4sH')
+            for _ in range(tier_count):
+                name, bucket, size = struct.unpack_from('<8sqI', data, offset)
+                offset += struct.calcsize('<8sqI')
+                columns = []
+                for typecode in 'qiqi':
+                    column = array.array(typecode)
+                    end = offset + column.itemsize * size
+                    column.frombytes(data[offset:end])
+                    if sys.byteorder == 'big':
+                        column.byteswap()
+                    columns.append(column)
+                    offset = end
+                series = self.tiers.get(name.rstrip(b'\0').decode())
+                if series is not None and series.bucket == bucket:
+                    for row in zip(*columns):
+                        series.append(*row)
+        except (struct.error, ValueError) as e:
+            print(f"Error reading {self.path}, starting a new player history: {e}")
+
+    async def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        try:
+            await run_io(atomic_write, self.path, self._encode())
+        except Exception as e:
+            self.dirty = True
+            print(f"Error saving {self.path}: {e}")
+
+    def summary(self, view, now=None):
+        """Peak, average and sparkline for a PLAYER_HISTORY_VIEWS key; None without data."""
+        tier, span = PLAYER_HISTORY_VIEWS[view]
+        since = int(now or time.time()) - span
+        rows = self.tiers[tier].rows(since)
+        if not rows:
+            return None
+        peak_row = max(rows, key=lambda row: row[1])
+        means = [total / count for start, peak, total, count in rows]
+        columns = [[] for _ in range(SPARKLINE_WIDTH)]
+        for (start, peak, total, count), mean in zip(rows, means):
+            columns[min((start - since) * SPARKLINE_WIDTH // span, SPARKLINE_WIDTH - 1)].append(mean)
+        top = max(means) or 1
+        sparkline = ''.join(
+            SPARKLINE_BARS[round(sum(column) / len(column) / top * (len(SPARKLINE_BARS) - 1))] if column else ' '
+            for column in columns
         )
+        return {
+            'peak': peak_row[1],
+            'peak_at': peak_row[0],
+            'average': sum(means) / len(means),
+            'samples': sum(row[3] for row in rows),
+            'sparkline': sparkline
+        }
 
-@bot.tree.command(name="status", description="Check the current server status")
-async def server_status(interaction: discord.Interaction):
+player_history = PlayerHistory(PLAYER_HISTORY_FILE, PLAYER_HISTORY_TIERS)
+
+@tasks.loop(minutes=PLAYER_HISTORY_FLUSH_INTERVAL)
+async def flush_player_history():
+    await player_history.flush()
+
+def history_embed(view, summary):
+    labels = {'24h': 'last 24 hours', '7d': 'last 7 days', '30d': 'last 30 days'}
+    embed = discord.Embed(
+        title=f"📈 Player History - {labels[view]}",
+        color=0x5865F2,
+        timestamp=datetime.datetime.now()
+    )
+    if summary is None:
+        embed.description = "No player data recorded for this period yet."
+        return embed
+    embed.add_field(name="Peak", value=f"{summary['peak']} players (<t:{summary['peak_at']}:f>)", inline=True)
+    embed.add_field(name="Average", value=f"{summary['average']:.1f} players", inline=True)
+    embed.add_field(name="Trend", value=f"```{summary['sparkline']}```", inline=False)
+    embed.set_footer(text=f"{summary['samples']} status checks")
+    return embed
+
+@tasks.loop(seconds=STATUS_POLL_MIN)
+async def update_server_status():
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(f'https://api.mcsrvstat.us/3/{MC_SERVER_IP}') as response:
-                if response.status == 200:
-                    data = await response.json()
-                    
-                    if data.get('online', False):
-                        embed = discord.Embed(
-                            title="🟢 Server Online",
-                            color=0x00ff00,
-                            timestamp=datetime.datetime.now()
-                        )
-                        
-                        players = data.get('players', {})
-                        online = players.get('online', 0)
-                        max_players = players.get('max', 0)
-                        version = data.get('version', 'Unknown')
-                        
-                        embed.add_field(name="Players Online", value=f"{online}/{max_players}", inline=True)
-                        embed.add_field(name="Version", value=version, inline=True)
-                        embed.add_field(name="Server IP", value=MC_SERVER_IP, inline=True)
-                        embed.add_field(name="Port", value=str(MC_SERVER_PORT), inline=True)
-                        embed.set_thumbnail(url=STATUS_IMAGE_1)
-                        embed.set_image(url=BANNER_IMAGE)
-                    else:
-                        embed = discord.Embed(
-                            title="🔴 Server Offline",
-                            color=0xff0000,
-                            timestamp=datetime.datetime.now()
-                        )
-                        embed.add_field(name="Server IP", value=MC_SERVER_IP, inline=True)
-                        embed.add_field(name="Port", value=str(MC_SERVER_PORT), inline=True)
-                        embed.set_thumbnail(url=STATUS_IMAGE_1)
-                        embed.set_image(url=BANNER_IMAGE)
-                    
-                    await interaction.response.send_message(embed=embed)
-                    return
-                    
+        delay = await status_poller.poll()
     except Exception as e:
-        print(f"Error in status command: {e}")
-        embed = discord.Embed(
-            title="🔴 Server Offline",
-            color=0xff0000,
-            timestamp=datetime.datetime.now()
-        )
-        embed.add_field(name="Server IP", value=MC_SERVER_IP, inline=True)
-        embed.add_field(name="Port", value=str(MC_SERVER_PORT), inline=True)
-        embed.set_thumbnail(url=STATUS_IMAGE_1)
-        embed.set_image(url=BANNER_IMAGE)
-        
-        await interaction.response.send_message(embed=embed)
+        print(f"Error updating server status: {e}")
+        delay = STATUS_POLL_MAX
+    update_server_status.change_interval(seconds=delay)
+
+@bot.tree.command(name="status", description="Check the current server status")
+@app_commands.describe(history="Show player count history instead of the current status")
+@app_commands.choices(history=[
+    app_commands.Choice(name="Last 24 hours", value="24h"),
+    app_commands.Choice(name="Last 7 days", value="7d"),
+    app_commands.Choice(name="Last 30 days", value="30d")
+])
+async def server_status(interaction: discord.Interaction, history: Optional[app_commands.Choice[str]] = None):
+    if history is not None:
+        await interaction.response.send_message(embed=history_embed(history.value, player_history.summary(history.value)))
+        return
+    snapshot = await server_status_cache.get()
+    await interaction.response.send_message(embed=status_poller.embed_for(snapshot))
+
+TEMP_ROLES_FILE = 'temp_roles.json'
+state_store.register(TEMP_ROLES_FILE, lambda: {'temp_roles': {}})
 
 def load_temp_roles():
     """
     Load temporary roles data from temp_roles.json.
-    Creates the file with default structure if it doesn't exist or is invalid.
+    Served from the state store; the file is created with the default structure on the next flush if missing.
     """
-    try:
-        with open('temp_roles.json', 'r') as f:
-            content = f.read()
-            if not content.strip():
-                return {'temp_roles': {}}
-            return json.load(f)
-    except (FileNotFoundError, json.JSONDecodeError):
-        default_data = {'temp_roles': {}}
-        with open('temp_roles.json', 'w') as f:
-            json.dump(default_data, f, indent=2)
-        return default_data
+    return state_store.get(TEMP_ROLES_FILE)
 
 def save_temp_roles(data):
     """
     Save temporary roles data to temp_roles.json.
     """
-    try:
-        with open('temp_roles.json', 'w') as f:
-            json.dump(data, f, indent=2)
-    except Exception as e:
-        print(f"Error saving temp_roles.json: {e}")
+    state_store.set(TEMP_ROLES_FILE, data)
 
 @bot.tree.command(name="setup_tickets", description="Setup the ticket system")
 @app_commands.describe(channel="Channel to send the ticket embed to")
@@ -660,72 +2746,19 @@ async def close_ticket(interaction: discord.Interaction):
         await interaction.response.send_message("You don't have permission to close tickets!", ephemeral=True)
         return
     
-    data = load_data()
-    channel_id = str(interaction.channel.id)
+    ticket_data, already_closing = await mark_ticket_closing(interaction.channel, create_missing=True)
     
-    if channel_id not in data['tickets']:
-        data['tickets'][channel_id] = {
-            'user_id': interaction.channel.topic.split('|')[0] if interaction.channel.topic else None,
-            'username': 'Unknown',
-            'type': interaction.channel.category.name if interaction.channel.category else 'Unknown',
-            'category': interaction.channel.category.name if interaction.channel.category else 'Unknown',
-            'created_at': datetime.datetime.now().isoformat(),
-            'last_activity': datetime.datetime.now().isoformat(),
-            'claimed_by': None,
-            'warning_sent': False
-        }
-        save_data(data)
+    if already_closing:
+        await interaction.response.send_message("This ticket is already being closed!", ephemeral=True)
+        return
 
-    messages = []
-    async for message in interaction.channel.history(limit=None, oldest_first=True):
-        messages.append(f"{message.author.name}: {message.content}")
-    
-    transcript = "\n".join(messages)
-    
-    ticket_data = data['tickets'][channel_id]
-    ticket_counts = load_ticket_counts()
-    
-    if ticket_data.get('claimed_by'):
-        closer_id = str(ticket_data['claimed_by'])
-        if closer_id not in ticket_counts['user_ticket_counts']:
-            ticket_counts['user_ticket_counts'][closer_id] = 0
-        ticket_counts['user_ticket_counts'][closer_id] += 1
-        save_ticket_counts(ticket_counts)
-    else:
-        closer_id = str(interaction.user.id)
-        if closer_id not in ticket_counts['user_ticket_counts']:
-            ticket_counts['user_ticket_counts'][closer_id] = 0
-        ticket_counts['user_ticket_counts'][closer_id] += 1
-        save_ticket_counts(ticket_counts)
-
-    logs_channel = bot.get_channel(TICKET_LOGS_CHANNEL_ID)
-    if logs_channel:
-        log_embed = discord.Embed(
-            title="🎫 Ticket Closed",
-            color=0xff0000,
-            timestamp=datetime.datetime.now()
-        )
-        log_embed.add_field(name="Ticket Type", value=interaction.channel.category.name, inline=True)
-        log_embed.add_field(name="Category", value=interaction.channel.category.name, inline=True)
-        log_embed.add_field(name="Closed By", value=interaction.user.mention, inline=True)
-        log_embed.add_field(name="Channel", value=interaction.channel.name, inline=True)
-        
-        transcript_file = discord.File(
-            io.StringIO(transcript),
-            filename=f"transcript-{interaction.channel.name}.txt"
-        )
-        await logs_channel.send(embed=log_embed, file=transcript_file)
-    
-    await interaction.response.send_message("Ticket will be deleted in 5 seconds...")
-    await asyncio.sleep(5)
-    await interaction.channel.delete()
+    await close_jobs.submit(interaction.channel, ticket_data, interaction.user.id)
+    await interaction.response.send_message(f"Ticket will be deleted in {CLOSE_DELETE_DELAY} seconds...")
 
 @bot.tree.command(name="ticket_check", description="Check how many tickets you have closed")
 async def ticket_check(interaction: discord.Interaction, user: Optional[discord.Member] = None):
     target_user = user or interaction.user
-    ticket_counts = load_ticket_counts()
-    
-    count = ticket_counts['user_ticket_counts'].get(str(target_user.id), 0)
+    count = await storage.get_count('tickets', target_user.id)
     
     embed = discord.Embed(
         title="📊 Ticket Statistics",
@@ -739,8 +2772,7 @@ async def ticket_check(interaction: discord.Interaction, user: Optional[discord.
 @bot.tree.command(name="report_check", description="Check how many reports you have submitted")
 async def report_check(interaction: discord.Interaction, user: Optional[discord.Member] = None):
     target_user = user or interaction.user
-    report_counts = load_report_counts()
-    count = report_counts['user_report_counts'].get(str(target_user.id), 0)
+    count = await storage.get_count('reports', target_user.id)
     embed = discord.Embed(
         title="📊 Report Statistics",
         description=f"{target_user.mention} has submitted **{count}** reports",
@@ -867,112 +2899,22 @@ async def create_report(interaction: discord.Interaction, username: str, duratio
     
     await interaction.response.send_message(embed=embed)
     
-    report_counts = load_report_counts()
-    user_id = str(interaction.user.id)
-    
-    if user_id not in report_counts['user_report_counts']:
-        report_counts['user_report_counts'][user_id] = 0
-    
-    report_counts['user_report_counts'][user_id] += 1
-    save_report_counts(report_counts)
+    await storage.add_count('reports', interaction.user.id, 1)
     
     if not has_team_permissions(interaction.user):
         del report_data['pending_reports'][user_id]
         save_report_data(report_data)
 
-@bot.event
-async def on_message(message):
-    if message.author.bot:
-        return
-    
-    if message.channel.id == EVIDENCE_CHANNEL_ID:
-        report_data = load_report_data()
-        user_id = str(message.author.id)
-        
-        if message.attachments:
-            for attachment in message.attachments:
-                if any(attachment.content_type.startswith(media_type) for media_type in ['image/', 'video/']):
-                    report_data['pending_reports'][user_id] = attachment.url
-                    await message.add_reaction('✅')
-                    await message.channel.send(f"{message.author.mention} Evidence received! You can now use the /report command.", delete_after=10)
-                    break
-        elif message.content.startswith(('http://', 'https://', 'medal.tv/')):
-            report_data['pending_reports'][user_id] = message.content
-            await message.add_reaction('✅')
-            await message.channel.send(f"{message.author.mention} Evidence link received! You can now use the /report command.", delete_after=10)
-        
-        save_report_data(report_data)
-    
-    afk_data = load_afk_data()
-    
-    excluded_channels = [
-        DISCUSSION_CHANNEL_ID,  # Discussion channel
-        CHAT_CHANNEL_ID,        # Chat channel
-        APPLICATIONS_CHANNEL_ID,  # Applications channel
-        LOA_CHANNEL_ID,         # LOA channel
-        STAFF_MOVEMENT_CHANNEL_ID,  # Staff movement channel
-        LIVE_ANNOUNCEMENT_CHANNEL_ID,  # Live announcement channel
-        EVIDENCE_CHANNEL_ID,    # Evidence channel
-    ]
-    
-    if str(message.author.id) in afk_data['afk_users'] and message.channel.id not in excluded_channels:
-        try:
-            data = afk_data['afk_users'][str(message.author.id)]
-            await message.author.edit(nick=data['original_nickname'])
-            del afk_data['afk_users'][str(message.author.id)]
-            save_afk_data(afk_data)
-            
-            embed = discord.Embed(
-                title="✅ Welcome Back!",
-                description=f"{message.author.mention} is no longer AFK",
-                color=0x00ff00,
-                timestamp=datetime.datetime.now()
-            )
-            await message.channel.send(embed=embed)
-        except:
-            pass
-    
-    for mention in message.mentions:
-        user_id = str(mention.id)
-        if user_id in afk_data['afk_users']:
-            data = afk_data['afk_users'][user_id]
-            end_time = datetime.datetime.fromisoformat(data['end_time'])
-            time_remaining = end_time - datetime.datetime.now()
-            
-            if time_remaining.total_seconds() > 0:
-                embed = discord.Embed(
-                    title="⏸️ User is AFK",
-                    description=f"{mention.mention} is currently AFK",
-                    color=0xffff00,
-                    timestamp=datetime.datetime.now()
-                )
-                embed.add_field(name="Reason", value=data['reason'], inline=True)
-                embed.add_field(name="Time Remaining", value=f"<t:{int(end_time.timestamp())}:R>", inline=True)
-                embed.set_thumbnail(url=mention.display_avatar.url)
-                
-                await message.channel.send(embed=embed, delete_after=10)
-    
-    await bot.process_commands(message)
-
 @bot.tree.command(name="ticket_stats", description="View ticket statistics (Admin only)")
 async def ticket_stats(interaction: discord.Interaction):
     if not has_ticket_admin_permissions(interaction.user):
         await interaction.response.send_message("You don't have permission to use this command!", ephemeral=True)
         return
     
-    data = load_data()
-    ticket_counts = load_ticket_counts()
-    
-    active_tickets = len(data['tickets'])
-    closed_tickets = len(data['closed_tickets'])
+    active_tickets, categories = await storage.ticket_stats()
+    closed_tickets = ticket_archive.index['total']
     total_tickets = active_tickets + closed_tickets
     
-
-    categories = {}
-    for ticket in data['tickets'].values():
-        category = ticket.get('category', 'Unknown')
-        categories[category] = categories.get(category, 0) + 1
-    
     embed = discord.Embed(
         title="📊 Server Ticket Statistics",
         color=0x5865F2,
@@ -988,8 +2930,7 @@ async def ticket_stats(interaction: discord.Interaction):
         embed.add_field(name="📂 Active by Category", value=category_text, inline=False)
     
   
-    top_closers = sorted(ticket_counts['user_ticket_counts'].items(), 
-                        key=lambda x: x[1], reverse=True)[:5]
+    top_closers = await storage.top_counts('tickets', 5)
     if top_closers:
         closer_text = ""
         for user_id, count in top_closers:
@@ -1002,6 +2943,57 @@ async def ticket_stats(interaction: discord.Interaction):
     
     await interaction.response.send_message(embed=embed)
 
+def format_stats(stats):
+    """Flatten a stats() dict into 'key=value' pairs, one level of nesting deep."""
+    parts = []
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            parts.extend(f"{key}.{name}={format_stats_value(inner)}" for name, inner in value.items())
+        else:
+            parts.append(f"{key}={format_stats_value(value)}")
+    return parts or ['(no data yet)']
+
+def format_stats_value(value):
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    if isinstance(value, dict):
+        return ','.join(f"{k}:{format_stats_value(v)}" for k, v in value.items())
+    return str(value)
+
+@tasks.loop(minutes=DIAGNOSTICS_LOG_INTERVAL)
+async def log_diagnostics():
+    for name, stats in DIAGNOSTICS.items():
+        print(f"[stats] {name}: {' '.join(format_stats(stats()))}")
+
+def diagnostics_embeds():
+    """Build the /diagnostics embeds, starting a new one whenever the next field would pass the size limits."""
+    embeds = []
+    embed = None
+    for name, stats in DIAGNOSTICS.items():
+        value = '\n'.join(format_stats(stats()))
+        value = f"```{value[:DIAGNOSTICS_FIELD_CHARS]}```"
+        if embed is None or len(embed.fields) == 25 or len(embed) + len(name) + len(value) > DIAGNOSTICS_EMBED_CHARS:
+            embed = discord.Embed(
+                title="🩺 Bot Diagnostics",
+                color=0x5865F2,
+                timestamp=datetime.datetime.now()
+            )
+            embeds.append(embed)
+        embed.add_field(name=name, value=value, inline=False)
+    if len(embeds) > 1:
+        for page, embed in enumerate(embeds, 1):
+            embed.title = f"🩺 Bot Diagnostics ({page}/{len(embeds)})"
+    return embeds or [discord.Embed(title="🩺 Bot Diagnostics", description="No components registered.", color=0x5865F2)]
+
+@bot.tree.command(name="diagnostics", description="Show internal queue and cache counters (Admin only)")
+@is_council()
+async def diagnostics(interaction: discord.Interaction):
+    # Discord's 6000 character limit covers every embed in a message, so each page is its own message.
+    embeds = diagnostics_embeds()
+    await interaction.response.send_message(embed=embeds[0], ephemeral=True)
+    for embed in embeds[1:]:
+        await interaction.followup.send(embed=embed, ephemeral=True)
+
 @bot.tree.command(name="warn", description="Warn a user")
 @is_council()
 async def warn(interaction: discord.Interaction, user: discord.Member, reason: str):
@@ -1011,22 +3003,13 @@ async def warn(interaction: discord.Interaction, user: discord.Member, reason: s
     """
     await interaction.response.defer()
     
-    warnings_data = load_warnings()
-    user_id = str(user.id)
-    
-    if user_id not in warnings_data['warnings']:
-        warnings_data['warnings'][user_id] = []
-    
     warning = {
         'reason': reason,
         'warned_by': interaction.user.id,
         'timestamp': datetime.datetime.now().isoformat()
     }
     
-    warnings_data['warnings'][user_id].append(warning)
-    save_warnings(warnings_data)
-    
-    warning_count = len(warnings_data['warnings'][user_id])
+    warning_count = await storage.add_warning(user.id, warning)
     
     embed = discord.Embed(
         title="⚠️ User Warned",
@@ -1047,20 +3030,17 @@ async def warn(interaction: discord.Interaction, user: discord.Member, reason: s
     
     await interaction.followup.send(embed=embed)
     
-    try:
-        dm_embed = discord.Embed(
-            title="⚠️ You have been warned",
-            description=f"You have received a warning in {interaction.guild.name}",
-            color=0xff4444,
-            timestamp=datetime.datetime.now()
-        )
-        dm_embed.add_field(name="Reason", value=reason, inline=False)
-        dm_embed.add_field(name="Warning Count", value=f"{warning_count}/5", inline=True)
-        if warning_count >= 5:
-            dm_embed.add_field(name="⚠️ Action Taken", value="All your roles have been stripped due to reaching 5 warnings.", inline=False)
-        await user.send(embed=dm_embed)
-    except:
-        pass
+    dm_embed = discord.Embed(
+        title="⚠️ You have been warned",
+        description=f"You have received a warning in {interaction.guild.name}",
+        color=0xff4444,
+        timestamp=datetime.datetime.now()
+    )
+    dm_embed.add_field(name="Reason", value=reason, inline=False)
+    dm_embed.add_field(name="Warning Count", value=f"{warning_count}/5", inline=True)
+    if warning_count >= 5:
+        dm_embed.add_field(name="⚠️ Action Taken", value="All your roles have been stripped due to reaching 5 warnings.", inline=False)
+    dm_dispatcher.send(user, embed=dm_embed)
 
 @bot.tree.command(name="warnings", description="Check warnings for a user")
 async def warnings(interaction: discord.Interaction, user: discord.Member):
@@ -1070,15 +3050,12 @@ async def warnings(interaction: discord.Interaction, user: discord.Member):
     
     await interaction.response.defer()
     
-    warnings_data = load_warnings()
-    user_id = str(user.id)
+    warnings = await storage.get_warnings(user.id)
     
-    if user_id not in warnings_data['warnings'] or not warnings_data['warnings'][user_id]:
+    if not warnings:
         await interaction.followup.send(f"{user.mention} has no warnings.", ephemeral=True)
         return
     
-    warnings = warnings_data['warnings'][user_id]
-    
     embed = discord.Embed(
         title=f"⚠️ Warnings for {user.name}",
         color=0xff4444,
@@ -1142,12 +3119,10 @@ async def on_ready():
     except Exception as e:
         print(f"Failed to sync commands: {e}")
     
-    await bot.change_presence(
-        activity=discord.Activity(
-            type=discord.ActivityType.playing,
-            name="🔄 Checking..."
-        )
-    )
+    await status_poller.show("🔄 Checking...")
+    
+    await archive_deleted_tickets()
+    asyncio.create_task(backfill_ticket_logs())
     
     update_server_status.start()
     check_temp_roles.start()
@@ -1172,14 +3147,7 @@ async def add_ticket(interaction: discord.Interaction, user: discord.Member, tic
         await interaction.response.send_message("Please enter a number greater than 0!", ephemeral=True)
         return
 
-    ticket_counts = load_ticket_counts()
-    user_id = str(user.id)
-    
-    if user_id not in ticket_counts['user_ticket_counts']:
-        ticket_counts['user_ticket_counts'][user_id] = 0
-    
-    ticket_counts['user_ticket_counts'][user_id] += ticket_type
-    save_ticket_counts(ticket_counts)
+    new_count = await storage.add_count('tickets', user.id, ticket_type)
     
     embed = discord.Embed(
         title="✅ Tickets Added",
@@ -1188,22 +3156,19 @@ async def add_ticket(interaction: discord.Interaction, user: discord.Member, tic
     )
     embed.add_field(name="User", value=user.mention, inline=True)
     embed.add_field(name="Tickets Added", value=str(ticket_type), inline=True)
-    embed.add_field(name="New Ticket Count", value=str(ticket_counts['user_ticket_counts'][user_id]), inline=True)
+    embed.add_field(name="New Ticket Count", value=str(new_count), inline=True)
     
     await interaction.response.send_message(embed=embed)
     
-    try:
-        dm_embed = discord.Embed(
-            title="📝 Tickets Added",
-            description=f"{ticket_type} ticket(s) have been added to your count by {interaction.user.mention}",
-            color=0x00ff00,
-            timestamp=datetime.datetime.now()
-        )
-        dm_embed.add_field(name="Tickets Added", value=str(ticket_type), inline=True)
-        dm_embed.add_field(name="Your Total Tickets", value=str(ticket_counts['user_ticket_counts'][user_id]), inline=True)
-        await user.send(embed=dm_embed)
-    except:
-        pass
+    dm_embed = discord.Embed(
+        title="📝 Tickets Added",
+        description=f"{ticket_type} ticket(s) have been added to your count by {interaction.user.mention}",
+        color=0x00ff00,
+        timestamp=datetime.datetime.now()
+    )
+    dm_embed.add_field(name="Tickets Added", value=str(ticket_type), inline=True)
+    dm_embed.add_field(name="Your Total Tickets", value=str(new_count), inline=True)
+    dm_dispatcher.send(user, embed=dm_embed)
 
 @bot.tree.command(name="remove_ticket", description="Remove tickets from a user's count (Council only)")
 @app_commands.describe(
@@ -1219,17 +3184,16 @@ async def remove_ticket(interaction: discord.Interaction, user: discord.Member,
         await interaction.response.send_message("Please enter a number greater than 0!", ephemeral=True)
         return
 
-    ticket_counts = load_ticket_counts()
-    user_id = str(user.id)
+    async with storage_lock('ticket_counts'):
+        current_count = await storage.get_count('tickets', user.id)
+        amount = min(amount, current_count)
+        if current_count > 0:
+            new_count = await storage.add_count('tickets', user.id, -amount)
     
-    if user_id not in ticket_counts['user_ticket_counts'] or ticket_counts['user_ticket_counts'][user_id] <= 0:
+    if current_count <= 0:
         await interaction.response.send_message("This user has no tickets to remove!", ephemeral=True)
         return
     
-    amount = min(amount, ticket_counts['user_ticket_counts'][user_id])
-    ticket_counts['user_ticket_counts'][user_id] -= amount
-    save_ticket_counts(ticket_counts)
-    
     embed = discord.Embed(
         title="✅ Tickets Removed",
         color=0x00ff00,
@@ -1237,22 +3201,19 @@ async def remove_ticket(interaction: discord.Interaction, user: discord.Member,
     )
     embed.add_field(name="User", value=user.mention, inline=True)
     embed.add_field(name="Tickets Removed", value=str(amount), inline=True)
-    embed.add_field(name="New Ticket Count", value=str(ticket_counts['user_ticket_counts'][user_id]), inline=True)
+    embed.add_field(name="New Ticket Count", value=str(new_count), inline=True)
     
     await interaction.response.send_message(embed=embed)
     
-    try:
-        dm_embed = discord.Embed(
-            title="📝 Tickets Removed",
-            description=f"{amount} ticket(s) have been removed from your count by {interaction.user.mention}",
-            color=0x00ff00,
-            timestamp=datetime.datetime.now()
-        )
-        dm_embed.add_field(name="Tickets Removed", value=str(amount), inline=True)
-        dm_embed.add_field(name="Your Total Tickets", value=str(ticket_counts['user_ticket_counts'][user_id]), inline=True)
-        await user.send(embed=dm_embed)
-    except:
-        pass
+    dm_embed = discord.Embed(
+        title="📝 Tickets Removed",
+        description=f"{amount} ticket(s) have been removed from your count by {interaction.user.mention}",
+        color=0x00ff00,
+        timestamp=datetime.datetime.now()
+    )
+    dm_embed.add_field(name="Tickets Removed", value=str(amount), inline=True)
+    dm_embed.add_field(name="Your Total Tickets", value=str(new_count), inline=True)
+    dm_dispatcher.send(user, embed=dm_embed)
 
 @bot.tree.command(name="temprole", description="Give a role to a user temporarily")
 @app_commands.describe(
@@ -1280,13 +3241,11 @@ async def temprole(interaction: discord.Interaction, user: discord.Member, role:
 
         await user.add_roles(role)
         
-        temp_roles = load_temp_roles()
-        temp_roles['temp_roles'][str(user.id)] = {
+        await storage.set_temp_role(user.id, {
             'role_id': role.id,
             'end_time': (datetime.datetime.now() + datetime.timedelta(seconds=duration_seconds)).isoformat(),
             'added_by': interaction.user.id
-        }
-        save_temp_roles(temp_roles)
+        })
         
         embed = discord.Embed(
             title="⏱️ Temporary Role Added",
@@ -1300,39 +3259,30 @@ async def temprole(interaction: discord.Interaction, user: discord.Member, role:
         
         await interaction.response.send_message(embed=embed)
         
-        try:
-            dm_embed = discord.Embed(
-                title="⏱️ Temporary Role Added",
-                description=f"You have been given the role {role.mention} in {interaction.guild.name}",
-                color=0x00ff00,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Duration", value=duration, inline=True)
-            dm_embed.add_field(name="Added By", value=interaction.user.mention, inline=True)
-            await user.send(embed=dm_embed)
-        except:
-            pass
+        dm_embed = discord.Embed(
+            title="⏱️ Temporary Role Added",
+            description=f"You have been given the role {role.mention} in {interaction.guild.name}",
+            color=0x00ff00,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Duration", value=duration, inline=True)
+        dm_embed.add_field(name="Added By", value=interaction.user.mention, inline=True)
+        dm_dispatcher.send(user, embed=dm_embed)
 
         await asyncio.sleep(duration_seconds)
         
         if role in user.roles:
             await user.remove_roles(role)
             
-            temp_roles = load_temp_roles()
-            if str(user.id) in temp_roles['temp_roles']:
-                del temp_roles['temp_roles'][str(user.id)]
-                save_temp_roles(temp_roles)
+            await storage.delete_temp_role(user.id)
             
-            try:
-                remove_embed = discord.Embed(
-                    title="⏱️ Temporary Role Removed",
-                    description=f"Your temporary role {role.mention} in {interaction.guild.name} has expired",
-                    color=0xff0000,
-                    timestamp=datetime.datetime.now()
-                )
-                await user.send(embed=remove_embed)
-            except:
-                pass
+            remove_embed = discord.Embed(
+                title="⏱️ Temporary Role Removed",
+                description=f"Your temporary role {role.mention} in {interaction.guild.name} has expired",
+                color=0xff0000,
+                timestamp=datetime.datetime.now()
+            )
+            dm_dispatcher.send(user, embed=remove_embed)
             
             log_embed = discord.Embed(
                 title="⏱️ Temporary Role Expired",
@@ -1344,7 +3294,7 @@ async def temprole(interaction: discord.Interaction, user: discord.Member, role:
             log_embed.add_field(name="Duration", value=duration, inline=True)
             log_embed.add_field(name="Added By", value=interaction.user.mention, inline=True)
             
-            await interaction.channel.send(embed=log_embed)
+            await log_sink.post(interaction.channel, log_embed)
             
     except Exception as e:
         await interaction.response.send_message(f"An error occurred: {str(e)}", ephemeral=True)
@@ -1356,21 +3306,17 @@ async def check_temp_roles():
     Runs every minute to check for roles that need to be removed.
     """
     try:
-        temp_roles = load_temp_roles()
         current_time = datetime.datetime.now()
         
-        for user_id, data in list(temp_roles['temp_roles'].items()):
+        for user_id, data in await storage.get_expired_temp_roles(current_time):
             try:
-                end_time = datetime.datetime.fromisoformat(data['end_time'])
-                if current_time >= end_time:
-                    guild = bot.guilds[0] if bot.guilds else None
-                    if guild:
-                        user = guild.get_member(int(user_id))
-                        role = guild.get_role(data['role_id'])
-                        if user and role and role in user.roles:
-                            await user.remove_roles(role)
-                            del temp_roles['temp_roles'][user_id]
-                            save_temp_roles(temp_roles)
+                guild = bot.guilds[0] if bot.guilds else None
+                if guild:
+                    user = guild.get_member(int(user_id))
+                    role = guild.get_role(data['role_id'])
+                    if user and role and role in user.roles:
+                        await user.remove_roles(role)
+                        await storage.delete_temp_role(user_id)
             except Exception as e:
                 print(f"Error processing temp role for user {user_id}: {e}")
                 continue
@@ -1393,14 +3339,12 @@ async def rename_ticket(interaction: discord.Interaction, new_name: str):
         return
     
     try:
-        data = load_data()
-        channel_id = str(interaction.channel.id)
+        ticket_data = await storage.get_ticket(interaction.channel.id)
         
-        if channel_id not in data['tickets']:
+        if ticket_data is None:
             await interaction.response.send_message("This ticket doesn't exist in the database!", ephemeral=True)
             return
         
-        ticket_data = data['tickets'][channel_id]
         old_name = interaction.channel.name
         
     
@@ -1446,7 +3390,7 @@ async def add_user(interaction: discord.Interaction, user: discord.Member):
         return
     
     try:
-        await interaction.channel.set_permissions(user, read_messages=True, send_messages=True)
+        await update_ticket_users(interaction.channel, add=user)
         
         embed = discord.Embed(
             title="👥 User Added to Ticket",
@@ -1458,18 +3402,15 @@ async def add_user(interaction: discord.Interaction, user: discord.Member):
         
         await interaction.response.send_message(embed=embed)
         
-        try:
-            dm_embed = discord.Embed(
-                title="🎫 Added to Ticket",
-                description=f"You have been added to a ticket in {interaction.guild.name}",
-                color=0x00ff00,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Ticket Channel", value=interaction.channel.mention, inline=True)
-            dm_embed.add_field(name="Added By", value=interaction.user.mention, inline=True)
-            await user.send(embed=dm_embed)
-        except:
-            pass
+        dm_embed = discord.Embed(
+            title="🎫 Added to Ticket",
+            description=f"You have been added to a ticket in {interaction.guild.name}",
+            color=0x00ff00,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Ticket Channel", value=interaction.channel.mention, inline=True)
+        dm_embed.add_field(name="Added By", value=interaction.user.mention, inline=True)
+        dm_dispatcher.send(user, embed=dm_embed)
         
     except Exception as e:
         await interaction.response.send_message(f"An error occurred while adding the user: {str(e)}", ephemeral=True)
@@ -1512,23 +3453,22 @@ async def announce_live(interaction: discord.Interaction, platform: str, url: st
             await asyncio.sleep(300)
             
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url) as response:
-                        if response.status != 200:
-                            end_embed = discord.Embed(
-                                title="🎥 Live Stream Ended",
-                                description=f"{interaction.user.name}'s stream on {platform} has ended.",
-                                color=0xff0000,
-                                timestamp=datetime.datetime.now()
-                            )
-                            end_embed.add_field(name="Platform", value=platform, inline=True)
-                            end_embed.add_field(name="Streamer", value=interaction.user.name, inline=True)
-                            end_embed.add_field(name="Title", value=title, inline=False)
-                            end_embed.set_thumbnail(url=interaction.user.display_avatar.url)
-                            end_embed.set_footer(text="Stream Ended")
-                            
-                            await message.edit(embed=end_embed)
-                            break
+                async with http_client.get(url, 'live') as response:
+                    if response.status != 200:
+                        end_embed = discord.Embed(
+                            title="🎥 Live Stream Ended",
+                            description=f"{interaction.user.name}'s stream on {platform} has ended.",
+                            color=0xff0000,
+                            timestamp=datetime.datetime.now()
+                        )
+                        end_embed.add_field(name="Platform", value=platform, inline=True)
+                        end_embed.add_field(name="Streamer", value=interaction.user.name, inline=True)
+                        end_embed.add_field(name="Title", value=title, inline=False)
+                        end_embed.set_thumbnail(url=interaction.user.display_avatar.url)
+                        end_embed.set_footer(text="Stream Ended")
+                        
+                        await message.edit(embed=end_embed)
+                        break
             except:
                 end_embed = discord.Embed(
                     title="🎥 Live Stream Ended",
@@ -1592,6 +3532,21 @@ async def on_guild_available(guild):
     except Exception as e:
         print(f"Failed to sync commands for guild {guild.name}: {e}")
 
+@bot.event
+async def on_raw_message_edit(payload):
+    if ticket_capture.is_ticket_channel(bot.get_channel(payload.channel_id)):
+        await ticket_capture.capture_edit(payload.channel_id, payload.message_id, payload.data)
+
+@bot.event
+async def on_raw_message_delete(payload):
+    if ticket_capture.is_ticket_channel(bot.get_channel(payload.channel_id)):
+        await ticket_capture.capture_delete(payload.channel_id, [payload.message_id])
+
+@bot.event
+async def on_raw_bulk_message_delete(payload):
+    if ticket_capture.is_ticket_channel(bot.get_channel(payload.channel_id)):
+        await ticket_capture.capture_delete(payload.channel_id, sorted(payload.message_ids))
+
 @bot.event
 async def on_app_command_error(interaction: discord.Interaction, error: app_commands.AppCommandError):
     if isinstance(error, app_commands.MissingRole):
@@ -1617,27 +3572,23 @@ class LOAView(discord.ui.View):
         
         await interaction.message.edit(embed=embed, view=None)
         
-        try:
-            user = await bot.fetch_user(self.user_id)
-            member = interaction.guild.get_member(self.user_id)
-            if member:
-                original_nickname = member.display_name
-                new_nickname = f"{member.name}[LOA]"
-                try:
-                    await member.edit(nick=new_nickname)
-                except:
-                    pass
+        member = interaction.guild.get_member(self.user_id)
+        if member:
+            original_nickname = member.display_name
+            new_nickname = f"{member.name}[LOA]"
+            try:
+                await member.edit(nick=new_nickname)
+            except:
+                pass
             
-            dm_embed = discord.Embed(
-                title="✅ LOA Request Accepted",
-                description="Your Leave of Absence request has been accepted.",
-                color=0x00ff00,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Accepted By", value=interaction.user.mention, inline=True)
-            await user.send(embed=dm_embed)
-        except:
-            pass
+        dm_embed = discord.Embed(
+            title="✅ LOA Request Accepted",
+            description="Your Leave of Absence request has been accepted.",
+            color=0x00ff00,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Accepted By", value=interaction.user.mention, inline=True)
+        dm_dispatcher.send(self.user_id, embed=dm_embed)
 
         await interaction.response.send_message("LOA request has been accepted!", ephemeral=True)
 
@@ -1654,18 +3605,14 @@ class LOAView(discord.ui.View):
         
         await interaction.message.edit(embed=embed, view=None)
         
-        try:
-            user = await bot.fetch_user(self.user_id)
-            dm_embed = discord.Embed(
-                title="❌ LOA Request Denied",
-                description="Your Leave of Absence request has been denied.",
-                color=0xff0000,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Denied By", value=interaction.user.mention, inline=True)
-            await user.send(embed=dm_embed)
-        except:
-            pass
+        dm_embed = discord.Embed(
+            title="❌ LOA Request Denied",
+            description="Your Leave of Absence request has been denied.",
+            color=0xff0000,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Denied By", value=interaction.user.mention, inline=True)
+        dm_dispatcher.send(self.user_id, embed=dm_embed)
 
         await interaction.response.send_message("LOA request has been denied!", ephemeral=True)
 
@@ -1767,17 +3714,14 @@ async def manage_role(interaction: discord.Interaction, user: discord.Member, ro
     embed.add_field(name="Action", value=f"Role {action} user", inline=True)
     embed.add_field(name="Modified By", value=interaction.user.mention, inline=True)
     await interaction.response.send_message(embed=embed)
-    try:
-        dm_embed = discord.Embed(
-            title="Role Update",
-            description=f"The role {role.name} has been {action} you in {interaction.guild.name}",
-            color=color,
-            timestamp=datetime.datetime.now()
-        )
-        dm_embed.add_field(name="Modified By", value=interaction.user.mention, inline=True)
-        await user.send(embed=dm_embed)
-    except:
-        pass
+    dm_embed = discord.Embed(
+        title="Role Update",
+        description=f"The role {role.name} has been {action} you in {interaction.guild.name}",
+        color=color,
+        timestamp=datetime.datetime.now()
+    )
+    dm_embed.add_field(name="Modified By", value=interaction.user.mention, inline=True)
+    dm_dispatcher.send(user, embed=dm_embed)
 
 class ApplicationResponseView(discord.ui.View):
     def __init__(self, user_id: int):
@@ -1797,18 +3741,14 @@ class ApplicationResponseView(discord.ui.View):
         
         await interaction.message.edit(embed=embed, view=None)
         
-        try:
-            user = await bot.fetch_user(self.user_id)
-            dm_embed = discord.Embed(
-                title="✅ Application Accepted",
-                description="Your staff application has been accepted! Please open a ticket to continue the process.",
-                color=0x00ff00,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Accepted By", value=interaction.user.mention, inline=True)
-            await user.send(embed=dm_embed)
-        except:
-            pass
+        dm_embed = discord.Embed(
+            title="✅ Application Accepted",
+            description="Your staff application has been accepted! Please open a ticket to continue the process.",
+            color=0x00ff00,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Accepted By", value=interaction.user.mention, inline=True)
+        dm_dispatcher.send(self.user_id, embed=dm_embed)
 
         await interaction.response.send_message("Application has been accepted!", ephemeral=True)
 
@@ -1825,18 +3765,14 @@ class ApplicationResponseView(discord.ui.View):
         
         await interaction.message.edit(embed=embed, view=None)
         
-        try:
-            user = await bot.fetch_user(self.user_id)
-            dm_embed = discord.Embed(
-                title="❌ Application Denied",
-                description="Your staff application has been denied. You can reapply in 14 days.",
-                color=0xff0000,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Denied By", value=interaction.user.mention, inline=True)
-            await user.send(embed=dm_embed)
-        except:
-            pass
+        dm_embed = discord.Embed(
+            title="❌ Application Denied",
+            description="Your staff application has been denied. You can reapply in 14 days.",
+            color=0xff0000,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Denied By", value=interaction.user.mention, inline=True)
+        dm_dispatcher.send(self.user_id, embed=dm_embed)
 
         await interaction.response.send_message("Application has been denied!", ephemeral=True)
 
@@ -1960,20 +3896,17 @@ async def remove_user(interaction: discord.Interaction, user: discord.Member):
         return
     
     try:
-        data = load_data()
-        channel_id = str(interaction.channel.id)
+        ticket_data = await storage.get_ticket(interaction.channel.id)
         
-        if channel_id not in data['tickets']:
+        if ticket_data is None:
             await interaction.response.send_message("This ticket doesn't exist in the database!", ephemeral=True)
             return
         
-        ticket_data = data['tickets'][channel_id]
-        
         if str(user.id) == str(ticket_data['user_id']):
             await interaction.response.send_message("You cannot remove the ticket creator!", ephemeral=True)
             return
         
-        await interaction.channel.set_permissions(user, read_messages=False, send_messages=False)
+        await update_ticket_users(interaction.channel, remove=user)
         
         embed = discord.Embed(
             title="👥 User Removed from Ticket",
@@ -1985,18 +3918,15 @@ async def remove_user(interaction: discord.Interaction, user: discord.Member):
         
         await interaction.response.send_message(embed=embed)
         
-        try:
-            dm_embed = discord.Embed(
-                title="🎫 Removed from Ticket",
-                description=f"You have been removed from a ticket in {interaction.guild.name}",
-                color=0xff0000,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Ticket Channel", value=interaction.channel.mention, inline=True)
-            dm_embed.add_field(name="Removed By", value=interaction.user.mention, inline=True)
-            await user.send(embed=dm_embed)
-        except:
-            pass
+        dm_embed = discord.Embed(
+            title="🎫 Removed from Ticket",
+            description=f"You have been removed from a ticket in {interaction.guild.name}",
+            color=0xff0000,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Ticket Channel", value=interaction.channel.mention, inline=True)
+        dm_embed.add_field(name="Removed By", value=interaction.user.mention, inline=True)
+        dm_dispatcher.send(user, embed=dm_embed)
         
     except Exception as e:
         await interaction.response.send_message(f"An error occurred while removing the user: {str(e)}", ephemeral=True)
@@ -2019,7 +3949,7 @@ async def kick(interaction: discord.Interaction, user: discord.Member, reason: s
         return
     
     try:
-        await user.kick(reason=f"Kicked by {interaction.user.name}: {reason}")
+        await outbound.run(PRIORITY_PUNITIVE, ('members', interaction.guild.id), user.kick, reason=f"Kicked by {interaction.user.name}: {reason}")
         
         embed = discord.Embed(
             title="👢 User Kicked",
@@ -2033,23 +3963,18 @@ async def kick(interaction: discord.Interaction, user: discord.Member, reason: s
         
         await interaction.followup.send(embed=embed)
         
-        try:
-            dm_embed = discord.Embed(
-                title="👢 You have been kicked",
-                description=f"You have been kicked from **{interaction.guild.name}**",
-                color=0xff8800,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Server", value=interaction.guild.name, inline=True)
-            dm_embed.add_field(name="Reason", value=reason, inline=False)
-            dm_embed.add_field(name="Kicked By", value=f"{interaction.user.name} ({interaction.user.id})", inline=True)
-            dm_embed.add_field(name="Date", value=f"<t:{int(datetime.datetime.now().timestamp())}:F>", inline=True)
-            dm_embed.set_footer(text="You can rejoin the server if you have an invite link")
-            await user.send(embed=dm_embed)
-        except discord.Forbidden:
-            print(f"Could not send DM to {user.name} - DMs are closed")
-        except Exception as e:
-            print(f"Error sending DM to {user.name}: {e}")
+        dm_embed = discord.Embed(
+            title="👢 You have been kicked",
+            description=f"You have been kicked from **{interaction.guild.name}**",
+            color=0xff8800,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Server", value=interaction.guild.name, inline=True)
+        dm_embed.add_field(name="Reason", value=reason, inline=False)
+        dm_embed.add_field(name="Kicked By", value=f"{interaction.user.name} ({interaction.user.id})", inline=True)
+        dm_embed.add_field(name="Date", value=f"<t:{int(datetime.datetime.now().timestamp())}:F>", inline=True)
+        dm_embed.set_footer(text="You can rejoin the server if you have an invite link")
+        dm_dispatcher.send(user, embed=dm_embed)
             
     except discord.Forbidden:
         await interaction.followup.send("I don't have permission to kick this user!", ephemeral=True)
@@ -2078,7 +4003,10 @@ async def ban(interaction: discord.Interaction, user: discord.Member, reason: st
         return
     
     try:
-        await user.ban(reason=f"Banned by {interaction.user.name}: {reason}", delete_message_days=delete_message_days)
+        await outbound.run(
+            PRIORITY_PUNITIVE, ('bans', interaction.guild.id), user.ban,
+            reason=f"Banned by {interaction.user.name}: {reason}", delete_message_days=delete_message_days
+        )
         
         embed = discord.Embed(
             title="🔨 User Banned",
@@ -2093,24 +4021,19 @@ async def ban(interaction: discord.Interaction, user: discord.Member, reason: st
         
         await interaction.followup.send(embed=embed)
         
-        try:
-            dm_embed = discord.Embed(
-                title="🔨 You have been banned",
-                description=f"You have been **permanently banned** from **{interaction.guild.name}**",
-                color=0xff0000,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Server", value=interaction.guild.name, inline=True)
-            dm_embed.add_field(name="Reason", value=reason, inline=False)
-            dm_embed.add_field(name="Banned By", value=f"{interaction.user.name} ({interaction.user.id})", inline=True)
-            dm_embed.add_field(name="Date", value=f"<t:{int(datetime.datetime.now().timestamp())}:F>", inline=True)
-            dm_embed.add_field(name="Message Deletion", value=f"{delete_message_days} days of messages deleted", inline=True)
-            dm_embed.set_footer(text="This ban is permanent. Contact staff if you believe this was a mistake.")
-            await user.send(embed=dm_embed)
-        except discord.Forbidden:
-            print(f"Could not send DM to {user.name} - DMs are closed")
-        except Exception as e:
-            print(f"Error sending DM to {user.name}: {e}")
+        dm_embed = discord.Embed(
+            title="🔨 You have been banned",
+            description=f"You have been **permanently banned** from **{interaction.guild.name}**",
+            color=0xff0000,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Server", value=interaction.guild.name, inline=True)
+        dm_embed.add_field(name="Reason", value=reason, inline=False)
+        dm_embed.add_field(name="Banned By", value=f"{interaction.user.name} ({interaction.user.id})", inline=True)
+        dm_embed.add_field(name="Date", value=f"<t:{int(datetime.datetime.now().timestamp())}:F>", inline=True)
+        dm_embed.add_field(name="Message Deletion", value=f"{delete_message_days} days of messages deleted", inline=True)
+        dm_embed.set_footer(text="This ban is permanent. Contact staff if you believe this was a mistake.")
+        dm_dispatcher.send(user, embed=dm_embed)
             
     except discord.Forbidden:
         await interaction.followup.send("I don't have permission to ban this user!", ephemeral=True)
@@ -2158,7 +4081,7 @@ async def timeout(interaction: discord.Interaction, user: discord.Member, durati
             await interaction.followup.send("Duration must be between 1 second and 28 days!", ephemeral=True)
             return
         timeout_until = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=duration_seconds)
-        await user.timeout(timeout_until, reason=f"Timed out by {interaction.user.name}: {reason}")
+        await outbound.run(PRIORITY_PUNITIVE, ('members', interaction.guild.id), user.timeout, timeout_until, reason=f"Timed out by {interaction.user.name}: {reason}")
         embed = discord.Embed(
             title="⏰ User Timed Out",
             color=0xffff00,
@@ -2171,25 +4094,20 @@ async def timeout(interaction: discord.Interaction, user: discord.Member, durati
         embed.add_field(name="Until", value=f"<t:{int(timeout_until.timestamp())}:R>", inline=True)
         embed.set_thumbnail(url=user.display_avatar.url)
         await interaction.followup.send(embed=embed)
-        try:
-            dm_embed = discord.Embed(
-                title="⏰ You have been timed out",
-                description=f"You have been **timed out** in **{interaction.guild.name}**",
-                color=0xffff00,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Server", value=interaction.guild.name, inline=True)
-            dm_embed.add_field(name="Duration", value=duration_text, inline=True)
-            dm_embed.add_field(name="Reason", value=reason, inline=False)
-            dm_embed.add_field(name="Timed Out By", value=f"{interaction.user.name} ({interaction.user.id})", inline=True)
-            dm_embed.add_field(name="Until", value=f"<t:{int(timeout_until.timestamp())}:F>", inline=True)
-            dm_embed.add_field(name="Time Remaining", value=f"<t:{int(timeout_until.timestamp())}:R>", inline=True)
-            dm_embed.set_footer(text="You will be able to send messages again when the timeout expires")
-            await user.send(embed=dm_embed)
-        except discord.Forbidden:
-            pass
-        except Exception:
-            pass
+        dm_embed = discord.Embed(
+            title="⏰ You have been timed out",
+            description=f"You have been **timed out** in **{interaction.guild.name}**",
+            color=0xffff00,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Server", value=interaction.guild.name, inline=True)
+        dm_embed.add_field(name="Duration", value=duration_text, inline=True)
+        dm_embed.add_field(name="Reason", value=reason, inline=False)
+        dm_embed.add_field(name="Timed Out By", value=f"{interaction.user.name} ({interaction.user.id})", inline=True)
+        dm_embed.add_field(name="Until", value=f"<t:{int(timeout_until.timestamp())}:F>", inline=True)
+        dm_embed.add_field(name="Time Remaining", value=f"<t:{int(timeout_until.timestamp())}:R>", inline=True)
+        dm_embed.set_footer(text="You will be able to send messages again when the timeout expires")
+        dm_dispatcher.send(user, embed=dm_embed)
     except discord.Forbidden:
         await interaction.followup.send("I don't have permission to timeout this user!", ephemeral=True)
     except ValueError:
@@ -2215,7 +4133,7 @@ async def untimeout(interaction: discord.Interaction, user: discord.Member, reas
         return
     
     try:
-        await user.timeout(None, reason=f"Timeout removed by {interaction.user.name}: {reason}")
+        await outbound.run(PRIORITY_PUNITIVE, ('members', interaction.guild.id), user.timeout, None, reason=f"Timeout removed by {interaction.user.name}: {reason}")
         
         embed = discord.Embed(
             title="✅ Timeout Removed",
@@ -2229,23 +4147,18 @@ async def untimeout(interaction: discord.Interaction, user: discord.Member, reas
         
         await interaction.followup.send(embed=embed)
         
-        try:
-            dm_embed = discord.Embed(
-                title="✅ Your timeout has been removed",
-                description=f"Your timeout in **{interaction.guild.name}** has been **removed**",
-                color=0x00ff00,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Server", value=interaction.guild.name, inline=True)
-            dm_embed.add_field(name="Removed By", value=f"{interaction.user.name} ({interaction.user.id})", inline=True)
-            dm_embed.add_field(name="Reason", value=reason, inline=False)
-            dm_embed.add_field(name="Date", value=f"<t:{int(datetime.datetime.now().timestamp())}:F>", inline=True)
-            dm_embed.set_footer(text="You can now send messages again in the server")
-            await user.send(embed=dm_embed)
-        except discord.Forbidden:
-            print(f"Could not send DM to {user.name} - DMs are closed")
-        except Exception as e:
-            print(f"Error sending DM to {user.name}: {e}")
+        dm_embed = discord.Embed(
+            title="✅ Your timeout has been removed",
+            description=f"Your timeout in **{interaction.guild.name}** has been **removed**",
+            color=0x00ff00,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Server", value=interaction.guild.name, inline=True)
+        dm_embed.add_field(name="Removed By", value=f"{interaction.user.name} ({interaction.user.id})", inline=True)
+        dm_embed.add_field(name="Reason", value=reason, inline=False)
+        dm_embed.add_field(name="Date", value=f"<t:{int(datetime.datetime.now().timestamp())}:F>", inline=True)
+        dm_embed.set_footer(text="You can now send messages again in the server")
+        dm_dispatcher.send(user, embed=dm_embed)
             
     except discord.Forbidden:
         await interaction.followup.send("I don't have permission to remove timeout from this user!", ephemeral=True)
@@ -2266,14 +4179,7 @@ async def add_report(interaction: discord.Interaction, user: discord.Member, amo
         await interaction.response.send_message("Please enter a number greater than 0!", ephemeral=True)
         return
 
-    report_counts = load_report_counts()
-    user_id = str(user.id)
-    
-    if user_id not in report_counts['user_report_counts']:
-        report_counts['user_report_counts'][user_id] = 0
-    
-    report_counts['user_report_counts'][user_id] += amount
-    save_report_counts(report_counts)
+    new_count = await storage.add_count('reports', user.id, amount)
     
     embed = discord.Embed(
         title="✅ Reports Added",
@@ -2282,22 +4188,19 @@ async def add_report(interaction: discord.Interaction, user: discord.Member, amo
     )
     embed.add_field(name="User", value=user.mention, inline=True)
     embed.add_field(name="Reports Added", value=str(amount), inline=True)
-    embed.add_field(name="New Report Count", value=str(report_counts['user_report_counts'][user_id]), inline=True)
+    embed.add_field(name="New Report Count", value=str(new_count), inline=True)
     
     await interaction.response.send_message(embed=embed)
     
-    try:
-        dm_embed = discord.Embed(
-            title="📝 Reports Added",
-            description=f"{amount} report(s) have been added to your count by {interaction.user.mention}",
-            color=0x00ff00,
-            timestamp=datetime.datetime.now()
-        )
-        dm_embed.add_field(name="Reports Added", value=str(amount), inline=True)
-        dm_embed.add_field(name="Your Total Reports", value=str(report_counts['user_report_counts'][user_id]), inline=True)
-        await user.send(embed=dm_embed)
-    except:
-        pass
+    dm_embed = discord.Embed(
+        title="📝 Reports Added",
+        description=f"{amount} report(s) have been added to your count by {interaction.user.mention}",
+        color=0x00ff00,
+        timestamp=datetime.datetime.now()
+    )
+    dm_embed.add_field(name="Reports Added", value=str(amount), inline=True)
+    dm_embed.add_field(name="Your Total Reports", value=str(new_count), inline=True)
+    dm_dispatcher.send(user, embed=dm_embed)
 
 @bot.tree.command(name="remove_report", description="Remove reports from a user's count (Council only)")
 @app_commands.describe(
@@ -2313,17 +4216,16 @@ async def remove_report(interaction: discord.Interaction, user: discord.Member,
         await interaction.response.send_message("Please enter a number greater than 0!", ephemeral=True)
         return
 
-    report_counts = load_report_counts()
-    user_id = str(user.id)
+    async with storage_lock('report_counts'):
+        current_count = await storage.get_count('reports', user.id)
+        amount = min(amount, current_count)
+        if current_count > 0:
+            new_count = await storage.add_count('reports', user.id, -amount)
     
-    if user_id not in report_counts['user_report_counts'] or report_counts['user_report_counts'][user_id] <= 0:
+    if current_count <= 0:
         await interaction.response.send_message("This user has no reports to remove!", ephemeral=True)
         return
     
-    amount = min(amount, report_counts['user_report_counts'][user_id])
-    report_counts['user_report_counts'][user_id] -= amount
-    save_report_counts(report_counts)
-    
     embed = discord.Embed(
         title="✅ Reports Removed",
         color=0x00ff00,
@@ -2331,34 +4233,28 @@ async def remove_report(interaction: discord.Interaction, user: discord.Member,
     )
     embed.add_field(name="User", value=user.mention, inline=True)
     embed.add_field(name="Reports Removed", value=str(amount), inline=True)
-    embed.add_field(name="New Report Count", value=str(report_counts['user_report_counts'][user_id]), inline=True)
+    embed.add_field(name="New Report Count", value=str(new_count), inline=True)
     
     await interaction.response.send_message(embed=embed)
     
-    try:
-        dm_embed = discord.Embed(
-            title="📝 Reports Removed",
-            description=f"{amount} report(s) have been removed from your count by {interaction.user.mention}",
-            color=0x00ff00,
-            timestamp=datetime.datetime.now()
-        )
-        dm_embed.add_field(name="Reports Removed", value=str(amount), inline=True)
-        dm_embed.add_field(name="Your Total Reports", value=str(report_counts['user_report_counts'][user_id]), inline=True)
-        await user.send(embed=dm_embed)
-    except:
-        pass
+    dm_embed = discord.Embed(
+        title="📝 Reports Removed",
+        description=f"{amount} report(s) have been removed from your count by {interaction.user.mention}",
+        color=0x00ff00,
+        timestamp=datetime.datetime.now()
+    )
+    dm_embed.add_field(name="Reports Removed", value=str(amount), inline=True)
+    dm_embed.add_field(name="Your Total Reports", value=str(new_count), inline=True)
+    dm_dispatcher.send(user, embed=dm_embed)
 
 @bot.tree.command(name="ticket_leaderboard", description="View the ticket closing leaderboard")
 async def ticket_leaderboard(interaction: discord.Interaction):
-    ticket_counts = load_ticket_counts()
+    sorted_users = await storage.top_counts('tickets', 20)
     
-    if not ticket_counts['user_ticket_counts']:
+    if not sorted_users:
         await interaction.response.send_message("No ticket data available yet!", ephemeral=True)
         return
     
-    sorted_users = sorted(ticket_counts['user_ticket_counts'].items(), 
-                         key=lambda x: x[1], reverse=True)[:20]
-    
     embed = discord.Embed(
         title="🏆 Ticket Closing Leaderboard",
         description="Top 20 ticket closers",
@@ -2391,15 +4287,12 @@ async def ticket_leaderboard(interaction: discord.Interaction):
 
 @bot.tree.command(name="report_leaderboard", description="View the report submission leaderboard")
 async def report_leaderboard(interaction: discord.Interaction):
-    report_counts = load_report_counts()
+    sorted_users = await storage.top_counts('reports', 20)
     
-    if not report_counts['user_report_counts']:
+    if not sorted_users:
         await interaction.response.send_message("No report data available yet!", ephemeral=True)
         return
     
-    sorted_users = sorted(report_counts['user_report_counts'].items(), 
-                         key=lambda x: x[1], reverse=True)[:20]
-    
     embed = discord.Embed(
         title="📊 Report Submission Leaderboard",
         description="Top 20 report submitters",
@@ -2433,11 +4326,8 @@ async def report_leaderboard(interaction: discord.Interaction):
 @tasks.loop(minutes=30)
 async def update_leaderboards():
     try:
-        ticket_counts = load_ticket_counts()
-        report_counts = load_report_counts()
-        
-        bot.ticket_leaderboard_data = ticket_counts['user_ticket_counts']
-        bot.report_leaderboard_data = report_counts['user_report_counts']
+        bot.ticket_leaderboard_data = await storage.all_counts('tickets')
+        bot.report_leaderboard_data = await storage.all_counts('reports')
         
         print("Leaderboards updated")
     except Exception as e:
@@ -2448,9 +4338,6 @@ async def update_leaderboards():
 async def promo_demo(interaction: discord.Interaction):
     await interaction.response.defer()
     
-    ticket_counts = load_ticket_counts()
-    report_counts = load_report_counts()
-    
     staff_role_ids = [TRIAL_ROLE_ID, HELPER_ROLE_ID, MOD_ROLE_ID, TICKET_ADMIN_ROLE_ID]
     
     guild = interaction.guild
@@ -2468,8 +4355,8 @@ async def promo_demo(interaction: discord.Interaction):
     
     for member in staff_members:
         user_id = str(member.id)
-        tickets_closed = ticket_counts['user_ticket_counts'].get(user_id, 0)
-        reports_submitted = report_counts['user_report_counts'].get(user_id, 0)
+        tickets_closed = await storage.get_count('tickets', user_id)
+        reports_submitted = await storage.get_count('reports', user_id)
         
         member_roles = [role.id for role in member.roles]
         
@@ -2553,28 +4440,47 @@ async def promo_demo(interaction: discord.Interaction):
     
     await interaction.followup.send(embed=embed)
 
+state_store.register(AFK_DATA_FILE, lambda: {'afk_users': {}})
+
 def load_afk_data():
-    try:
-        with open(AFK_DATA_FILE, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-            if not content:
-                return {'afk_users': {}}
-            return json.loads(content)
-    except (FileNotFoundError, json.JSONDecodeError, ValueError):
-        default_data = {'afk_users': {}}
-        try:
-            with open(AFK_DATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump(default_data, f, indent=2)
-        except Exception as e:
-            print(f"Error creating AFK data file: {e}")
-        return default_data
+    return state_store.get(AFK_DATA_FILE)
 
 def save_afk_data(data):
-    try:
-        with open(AFK_DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving AFK data: {e}")
+    state_store.set(AFK_DATA_FILE, data)
+
+class AfkRegistry:
+    """
+    In-memory AFK users keyed by user ID, loaded once at startup.
+    Lookups never touch storage; storage is only written when the AFK set changes.
+    """
+    def __init__(self):
+        self.records = {}
+
+    async def load(self):
+        self.records = {int(user_id): record for user_id, record in (await storage.all_afk()).items()}
+
+    def get(self, user_id):
+        return self.records.get(user_id)
+
+    def mentioned(self, users):
+        """Return (user, record) for every AFK user among the given users."""
+        if not self.records:
+            return []
+        afk_ids = self.records.keys() & {user.id for user in users}
+        return [(user, self.records[user.id]) for user in users if user.id in afk_ids]
+
+    def expired(self, now):
+        return [(user_id, record) for user_id, record in self.records.items() if is_expired(record['end_time'], now)]
+
+    async def add(self, user_id, record):
+        await storage.set_afk(user_id, record)
+        self.records[user_id] = record
+
+    async def remove(self, user_id):
+        if self.records.pop(user_id, None) is not None:
+            await storage.delete_afk(user_id)
+
+afk_registry = AfkRegistry()
 
 @bot.tree.command(name="afk", description="Set yourself as AFK")
 @app_commands.describe(
@@ -2616,13 +4522,11 @@ async def afk(interaction: discord.Interaction, reason: str, duration: str):
             return
 
         try:
-            afk_data = load_afk_data()
-            afk_data['afk_users'][str(interaction.user.id)] = {
+            await afk_registry.add(interaction.user.id, {
                 'original_nickname': original_nickname,
                 'reason': reason,
                 'end_time': (datetime.datetime.now() + datetime.timedelta(seconds=duration_seconds)).isoformat()
-            }
-            save_afk_data(afk_data)
+            })
         except Exception as e:
             print(f"Error saving AFK data: {e}")
             try:
@@ -2708,7 +4612,7 @@ class StaffReportModal(discord.ui.Modal):
         embed.add_field(name="Reported By", value="Anonymous", inline=True)
         embed.set_footer(text="Anonymous Report")
         
-        await reports_channel.send(embed=embed)
+        await log_sink.post(reports_channel, embed, priority=True)
         await interaction.response.send_message("Your anonymous report has been submitted successfully.", ephemeral=True)
 
 @bot.tree.command(name="rep", description="Submit an anonymous report about a staff member")
@@ -2757,7 +4661,7 @@ async def mute(interaction: discord.Interaction, user: discord.Member, duration:
             return
 
         timeout_until = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=duration_seconds)
-        await user.timeout(timeout_until, reason=f"Muted by {interaction.user.name}: {reason}")
+        await outbound.run(PRIORITY_PUNITIVE, ('members', interaction.guild.id), user.timeout, timeout_until, reason=f"Muted by {interaction.user.name}: {reason}")
 
         embed = discord.Embed(
             title="🔇 User Muted",
@@ -2773,22 +4677,19 @@ async def mute(interaction: discord.Interaction, user: discord.Member, duration:
 
         await interaction.response.send_message(embed=embed)
 
-        try:
-            dm_embed = discord.Embed(
-                title="🔇 You have been muted",
-                description=f"You have been **muted** in **{interaction.guild.name}**",
-                color=0xff8800,
-                timestamp=datetime.datetime.now()
-            )
-            dm_embed.add_field(name="Server", value=interaction.guild.name, inline=True)
-            dm_embed.add_field(name="Duration", value=duration, inline=True)
-            dm_embed.add_field(name="Reason", value=reason, inline=False)
-            dm_embed.add_field(name="Muted By", value=f"{interaction.user.name} ({interaction.user.id})", inline=True)
-            dm_embed.add_field(name="Until", value=f"<t:{int(timeout_until.timestamp())}:F>", inline=True)
-            dm_embed.set_footer(text="You will be able to send messages again when the mute expires")
-            await user.send(embed=dm_embed)
-        except:
-            pass
+        dm_embed = discord.Embed(
+            title="🔇 You have been muted",
+            description=f"You have been **muted** in **{interaction.guild.name}**",
+            color=0xff8800,
+            timestamp=datetime.datetime.now()
+        )
+        dm_embed.add_field(name="Server", value=interaction.guild.name, inline=True)
+        dm_embed.add_field(name="Duration", value=duration, inline=True)
+        dm_embed.add_field(name="Reason", value=reason, inline=False)
+        dm_embed.add_field(name="Muted By", value=f"{interaction.user.name} ({interaction.user.id})", inline=True)
+        dm_embed.add_field(name="Until", value=f"<t:{int(timeout_until.timestamp())}:F>", inline=True)
+        dm_embed.set_footer(text="You will be able to send messages again when the mute expires")
+        dm_dispatcher.send(user, embed=dm_embed)
 
     except discord.Forbidden:
         await interaction.response.send_message("I don't have permission to mute this user!", ephemeral=True)
@@ -2798,31 +4699,28 @@ async def mute(interaction: discord.Interaction, user: discord.Member, duration:
 @tasks.loop(minutes=1)
 async def check_afk_status():
     try:
-        afk_data = load_afk_data()
         current_time = datetime.datetime.now()
         
-        for user_id, data in list(afk_data['afk_users'].items()):
+        for user_id, data in afk_registry.expired(current_time):
             try:
-                end_time = datetime.datetime.fromisoformat(data['end_time'])
-                if current_time >= end_time:
-                    guild = bot.guilds[0] if bot.guilds else None
-                    if guild:
-                        user = guild.get_member(int(user_id))
-                        if user:
-                            try:
-                                await user.edit(nick=data['original_nickname'])
-                                del afk_data['afk_users'][user_id]
-                                save_afk_data(afk_data)
-                                
-                                embed = discord.Embed(
-                                    title="✅ AFK Status Removed",
-                                    description=f"{user.mention} is no longer AFK",
-                                    color=0x00ff00,
-                                    timestamp=datetime.datetime.now()
-                                )
-                                await guild.system_channel.send(embed=embed) if guild.system_channel else None
-                            except:
-                                pass
+                guild = bot.guilds[0] if bot.guilds else None
+                if guild:
+                    user = guild.get_member(user_id)
+                    if user:
+                        try:
+                            await outbound.run(PRIORITY_COSMETIC, ('members', guild.id), user.edit, nick=data['original_nickname'])
+                            await afk_registry.remove(user_id)
+                            
+                            embed = discord.Embed(
+                                title="✅ AFK Status Removed",
+                                description=f"{user.mention} is no longer AFK",
+                                color=0x00ff00,
+                                timestamp=datetime.datetime.now()
+                            )
+                            if guild.system_channel:
+                                await log_sink.post(guild.system_channel, embed)
+                        except:
+                            pass
             except Exception as e:
                 print(f"Error processing AFK for user {user_id}: {e}")
                 continue
@@ -2843,62 +4741,90 @@ LEVEL_ROLE_40 = 1390759758436499516
 LEVEL_ROLE_45 = 1390759828296569023
 LEVEL_ROLE_50 = 1390760197034610759
 
-import threading
+state_store.register(LEVEL_DATA_FILE, dict)
 
 def load_level_data():
-    try:
-        with open(LEVEL_DATA_FILE, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-            if not content:
-                return {}
-            return json.loads(content)
-    except (FileNotFoundError, json.JSONDecodeError, ValueError):
-        default_data = {}
-        try:
-            with open(LEVEL_DATA_FILE, 'w', encoding='utf-8') as f:
-                json.dump(default_data, f, indent=2)
-        except Exception as e:
-            print(f"Error creating level data file: {e}")
-        return default_data
+    return state_store.get(LEVEL_DATA_FILE)
 
 def save_level_data(data):
-    try:
-        with open(LEVEL_DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
-    except Exception as e:
-        print(f"Error saving level data: {e}")
-
-async def give_level_role(member, level):
-    role_map = {
-        5: LEVEL_ROLE_5,
-        10: LEVEL_ROLE_10,
-        15: LEVEL_ROLE_15,
-        20: LEVEL_ROLE_20,
-        25: LEVEL_ROLE_25,
-        30: LEVEL_ROLE_30,
-        35: LEVEL_ROLE_35,
-        40: LEVEL_ROLE_40,
-        45: LEVEL_ROLE_45,
-        50: LEVEL_ROLE_50
-    }
-    if level in role_map:
-        role = member.guild.get_role(role_map[level])
-        if role and role not in member.roles:
-            await member.add_roles(role)
-    if level == 50:
-        echo_role = member.guild.get_role(ECHO_ROLE_ID)
-        if echo_role and echo_role not in member.roles:
-            await member.add_roles(echo_role)
-            async def remove_echo_role_later():
-                await asyncio.sleep(2592000)
-                if echo_role in member.roles:
-                    await member.remove_roles(echo_role)
-            asyncio.create_task(remove_echo_role_later())
+    state_store.set(LEVEL_DATA_FILE, data)
+
+LEVEL_ROLES = {
+    5: LEVEL_ROLE_5,
+    10: LEVEL_ROLE_10,
+    15: LEVEL_ROLE_15,
+    20: LEVEL_ROLE_20,
+    25: LEVEL_ROLE_25,
+    30: LEVEL_ROLE_30,
+    35: LEVEL_ROLE_35,
+    40: LEVEL_ROLE_40,
+    45: LEVEL_ROLE_45,
+    50: LEVEL_ROLE_50
+}
+
+LEVEL_ROLE_MILESTONES = sorted(LEVEL_ROLES)
+REWARD_ROLE_IDS = frozenset(LEVEL_ROLES.values()) | {ECHO_ROLE_ID}
+ROLE_REWARD_DEBOUNCE = 3  # seconds to wait for further level-ups before editing roles
+
+def target_reward_roles(record, now):
+    """The reward role IDs a member should hold: their highest level role plus Echo while it lasts."""
+    role_ids = set()
+    if record:
+        tier = bisect.bisect_right(LEVEL_ROLE_MILESTONES, record["level"])
+        if tier:
+            role_ids.add(LEVEL_ROLES[LEVEL_ROLE_MILESTONES[tier - 1]])
+        if record.get("echo_time") and not is_expired(record["echo_time"], now):
+            role_ids.add(ECHO_ROLE_ID)
+    return role_ids
+
+class RoleRewardReconciler:
+    """
+    Brings a member's level reward roles in line with their level record.
+    Requests are debounced per member and applied as one member.edit(roles=...),
+    which adds the current tier and drops any stale reward roles together.
+    """
+    def __init__(self, delay):
+        self.delay = delay
+        self.pending = {}
+
+    def schedule(self, member):
+        key = (member.guild.id, member.id)
+        if key not in self.pending:
+            self.pending[key] = asyncio.create_task(self._run(key, member))
+
+    async def _run(self, key, member):
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.pending.pop(key, None)
+        try:
+            await self.apply(member.guild.get_member(member.id) or member)
+        except Exception as e:
+            print(f"Error updating level roles for {member}: {e}")
+
+    async def apply(self, member):
+        record = await xp_accumulator.get_level(member.id)
+        target = target_reward_roles(record, datetime.datetime.now())
+        current = [role for role in member.roles if not role.is_default()]
+        roles = [role for role in current if role.id not in REWARD_ROLE_IDS]
+        for role_id in target:
+            role = member.guild.get_role(role_id)
+            if role:
+                roles.append(role)
+        if set(roles) != set(current):
+            await outbound.run(PRIORITY_COSMETIC, ('members', member.guild.id), member.edit, roles=roles, reason="Level rewards")
+
+role_rewards = RoleRewardReconciler(ROLE_REWARD_DEBOUNCE)
 
 async def announce_level_up(member, level):
     channel = member.guild.get_channel(LEVEL_ANNOUNCE_CHANNEL_ID)
     if channel:
-        await channel.send(f"{member.mention} reached level {level}!")
+        embed = discord.Embed(
+            description=f"{member.mention} reached level {level}!",
+            color=0x5865F2,
+            timestamp=datetime.datetime.now()
+        )
+        await log_sink.post(channel, embed, mention=member.mention)
 
 def get_xp_needed(level):
     if level < 10:
@@ -2914,104 +4840,308 @@ def get_xp_needed(level):
     else:
         return 88500
 
-@bot.event
-async def on_message(message):
-    if message.author.bot:
-        return
-    afk_data = load_afk_data()
-    excluded_channels = [
-        DISCUSSION_CHANNEL_ID,
-        CHAT_CHANNEL_ID,
-        APPLICATIONS_CHANNEL_ID,
-        LOA_CHANNEL_ID,
-        STAFF_MOVEMENT_CHANNEL_ID,
-        LIVE_ANNOUNCEMENT_CHANNEL_ID,
-        EVIDENCE_CHANNEL_ID,
-    ]
-    if str(message.author.id) in afk_data['afk_users'] and message.channel.id not in excluded_channels:
-        try:
-            data = afk_data['afk_users'][str(message.author.id)]
-            await message.author.edit(nick=data['original_nickname'])
-            del afk_data['afk_users'][str(message.author.id)]
-            save_afk_data(afk_data)
-            embed = discord.Embed(
-                title="✅ Welcome Back!",
-                description=f"{message.author.mention} is no longer AFK",
-                color=0x00ff00,
-                timestamp=datetime.datetime.now()
-            )
-            await message.channel.send(embed=embed)
-        except:
-            pass
-    for mention in message.mentions:
-        user_id = str(mention.id)
-        if user_id in afk_data['afk_users']:
-            data = afk_data['afk_users'][user_id]
-            end_time = datetime.datetime.fromisoformat(data['end_time'])
-            time_remaining = end_time - datetime.datetime.now()
-            if time_remaining.total_seconds() > 0:
-                embed = discord.Embed(
-                    title="⏸️ User is AFK",
-                    description=f"{mention.mention} is currently AFK",
-                    color=0xffff00,
-                    timestamp=datetime.datetime.now()
-                )
-                embed.add_field(name="Reason", value=data['reason'], inline=True)
-                embed.add_field(name="Time Remaining", value=f"<t:{int(end_time.timestamp())}:R>", inline=True)
-                embed.set_thumbnail(url=mention.display_avatar.url)
-                await message.channel.send(embed=embed, delete_after=10)
-    level_data = load_level_data()
-    user_id = str(message.author.id)
-    if user_id not in level_data:
-        level_data[user_id] = {"xp": 0, "level": 1, "echo_time": None}
-    level = level_data[user_id]["level"]
-    xp = level_data[user_id]["xp"]
+MAX_LEVEL = 50
+
+def build_xp_table(xp_needed, max_level=MAX_LEVEL):
+    """Cumulative XP table: table[level - 1] is the total XP at which `level` is reached."""
+    table = [0]
+    for level in range(1, max_level):
+        table.append(table[-1] + xp_needed(level))
+    return table
+
+XP_TABLE = build_xp_table(get_xp_needed)
+
+def level_from_total_xp(total_xp):
+    return bisect.bisect_right(XP_TABLE, total_xp)
+
+def total_xp(record):
+    return XP_TABLE[record["level"] - 1] + record["xp"]
+
+XP_FLUSH_INTERVAL = 30  # seconds
+XP_FLUSH_THRESHOLD = 500  # dirty users that trigger an early flush
+XP_POLICY = 'cooldown'  # 'cooldown', 'token_bucket' or None to award XP for every message
+XP_COOLDOWN = 60  # seconds between XP-earning messages in cooldown mode
+XP_BUCKET_SIZE = 5  # burst of XP-earning messages in token bucket mode
+XP_BUCKET_REFILL = 15  # seconds to regain one token in token bucket mode
+
+def get_xp_gain(level):
     if level < 10:
-        gain = 10
+        return 10
     elif level < 20:
-        gain = 5
+        return 5
     elif level < 30:
-        gain = 2
+        return 2
     elif level < 40:
-        gain = 1
+        return 1
     elif level < 50:
-        gain = 1
+        return 1
     else:
-        gain = 0
-    if level < 50:
-        level_data[user_id]["xp"] += gain
-        xp_needed = get_xp_needed(level)
-        while level_data[user_id]["xp"] >= xp_needed and level < 50:
-            level_data[user_id]["xp"] -= xp_needed
-            level += 1
-            level_data[user_id]["level"] = level
-            asyncio.create_task(give_level_role(message.author, level))
-            asyncio.create_task(announce_level_up(message.author, level))
-            xp_needed = get_xp_needed(level)
-            if level == 50:
-                level_data[user_id]["echo_time"] = (datetime.datetime.now() + datetime.timedelta(days=30)).isoformat()
-    save_level_data(level_data)
+        return 0
+
+class XpPolicy:
+    """
+    Per-user XP rate limit. Each user costs one float: the time their bucket is next
+    empty (GCRA), so cooldown is simply a bucket of size 1. Suppressed messages never
+    reach the XP accumulator.
+    """
+    def __init__(self, mode, cooldown, bucket_size, refill):
+        self.mode = mode
+        if mode == 'token_bucket':
+            self.interval = refill
+            self.tolerance = refill * (bucket_size - 1)
+        else:
+            self.interval = cooldown
+            self.tolerance = 0
+        self.ready_at = {}
+        self.eligible = 0
+        self.suppressed = 0
+
+    def allow(self, user_id, now=None):
+        if self.mode is None:
+            self.eligible += 1
+            return True
+        now = time.monotonic() if now is None else now
+        ready_at = max(self.ready_at.get(user_id, now), now)
+        if ready_at - now > self.tolerance:
+            self.suppressed += 1
+            return False
+        self.ready_at[user_id] = ready_at + self.interval
+        self.eligible += 1
+        return True
+
+    def prune(self, now=None):
+        """Drop users whose bucket has fully refilled; they behave exactly like new users."""
+        now = time.monotonic() if now is None else now
+        self.ready_at = {user_id: ready_at for user_id, ready_at in self.ready_at.items() if ready_at > now}
+
+    def stats(self):
+        return {'eligible': self.eligible, 'suppressed': self.suppressed, 'tracked': len(self.ready_at)}
+
+xp_policy = XpPolicy(XP_POLICY, XP_COOLDOWN, XP_BUCKET_SIZE, XP_BUCKET_REFILL)
+DIAGNOSTICS['xp_policy'] = xp_policy.stats
+
+class XpAccumulator:
+    """
+    In-memory level records for users who have chatted since startup.
+    XP gains and level-ups are applied here; dirty records are written to storage
+    in batches every XP_FLUSH_INTERVAL seconds or once XP_FLUSH_THRESHOLD users are dirty.
+    """
+    def __init__(self):
+        self.records = {}
+        self.dirty = set()
+        self.flushing = False
+        self.messages = 0
+        self.window_messages = 0
+        self.window_start = time.monotonic()
+
+    async def get_record(self, user_id):
+        user_id = str(user_id)
+        record = self.records.get(user_id)
+        if record is None:
+            loaded = await storage.get_level(user_id) or {"xp": 0, "level": 1, "echo_time": None}
+            record = self.records.setdefault(user_id, loaded)
+        return record
+
+    async def get_level(self, user_id):
+        record = self.records.get(str(user_id))
+        if record is not None:
+            return record
+        return await storage.get_level(user_id)
+
+    def mark_dirty(self, user_id):
+        self.dirty.add(str(user_id))
+        if len(self.dirty) >= XP_FLUSH_THRESHOLD and not self.flushing:
+            asyncio.create_task(self.flush())
+
+    async def add_message_xp(self, user_id):
+        """Apply one message's XP and return the levels the user crossed."""
+        record = await self.get_record(user_id)
+        self.messages += 1
+        self.window_messages += 1
+        level = record["level"]
+        if level >= MAX_LEVEL:
+            return []
+        total = total_xp(record) + get_xp_gain(level)
+        new_level = level_from_total_xp(total)
+        record["xp"] = total - XP_TABLE[new_level - 1]
+        if new_level > level:
+            record["level"] = new_level
+            if new_level == MAX_LEVEL:
+                record["echo_time"] = (datetime.datetime.now() + datetime.timedelta(days=30)).isoformat()
+        self.mark_dirty(user_id)
+        return list(range(level + 1, new_level + 1))
+
+    def messages_per_second(self):
+        elapsed = time.monotonic() - self.window_start
+        return self.window_messages / elapsed if elapsed > 0 else 0.0
+
+    async def flush(self):
+        if self.flushing or not self.dirty:
+            return
+        self.flushing = True
+        try:
+            batch = {user_id: dict(self.records[user_id]) for user_id in self.dirty}
+            self.dirty.clear()
+            try:
+                await storage.save_levels(batch)
+            except Exception as e:
+                self.dirty.update(batch)
+                print(f"Error saving level data: {e}")
+                return
+            stats = xp_policy.stats()
+            print(f"Saved {len(batch)} level records ({self.messages_per_second():.1f} XP messages/s, "
+                  f"{stats['eligible']} eligible / {stats['suppressed']} suppressed)")
+            self.window_messages = 0
+            self.window_start = time.monotonic()
+        finally:
+            self.flushing = False
+
+    def stats(self):
+        return {
+            'messages': self.messages,
+            'messages_per_second': self.messages_per_second(),
+            'cached': len(self.records),
+            'dirty': len(self.dirty)
+        }
+
+xp_accumulator = XpAccumulator()
+DIAGNOSTICS['xp_accumulator'] = xp_accumulator.stats
+
+@tasks.loop(seconds=XP_FLUSH_INTERVAL)
+async def flush_xp():
+    xp_policy.prune()
+    await xp_accumulator.flush()
+
+TICKET_CATEGORY_IDS = (SUPPORT_CATEGORY_ID, MEDIA_CATEGORY_ID, REPORTS_CATEGORY_ID, APPEALS_CATEGORY_ID)
+AFK_EXCLUDED_CHANNELS = (
+    DISCUSSION_CHANNEL_ID,
+    CHAT_CHANNEL_ID,
+    APPLICATIONS_CHANNEL_ID,
+    LOA_CHANNEL_ID,
+    STAFF_MOVEMENT_CHANNEL_ID,
+    LIVE_ANNOUNCEMENT_CHANNEL_ID,
+    EVIDENCE_CHANNEL_ID,
+)
+TICKET_ACTIVITY_INTERVAL = 60  # seconds between last_activity writes for one ticket
+
+ticket_activity_written = {}
+
+async def collect_evidence(message):
+    evidence = None
+    for attachment in message.attachments:
+        if attachment.content_type and attachment.content_type.startswith(('image/', 'video/')):
+            evidence = attachment.url
+            reply = "Evidence received! You can now use the /report command."
+            break
+    if not message.attachments and message.content.startswith(('http://', 'https://', 'medal.tv/')):
+        evidence = message.content
+        reply = "Evidence link received! You can now use the /report command."
+    if evidence is None:
+        return
+    report_data = load_report_data()
+    report_data['pending_reports'][str(message.author.id)] = evidence
+    save_report_data(report_data)
+    await message.add_reaction('✅')
+    await message.channel.send(f"{message.author.mention} {reply}", delete_after=10)
+
+async def touch_ticket_activity(message):
+    now = time.monotonic()
+    if now - ticket_activity_written.get(message.channel.id, 0) < TICKET_ACTIVITY_INTERVAL:
+        return
+    ticket_activity_written[message.channel.id] = now
+    async with storage_lock('tickets'):
+        ticket_data = await storage.get_ticket(message.channel.id)
+        if ticket_data and not ticket_data.get('closing'):
+            ticket_data['last_activity'] = datetime.datetime.now().isoformat()
+            await storage.save_ticket(message.channel.id, ticket_data)
+
+async def award_xp(message):
+    if not xp_policy.allow(message.author.id):
+        return
+    levels = await xp_accumulator.add_message_xp(message.author.id)
+    if levels:
+        role_rewards.schedule(message.author)
+    for level in levels:
+        asyncio.create_task(announce_level_up(message.author, level))
+
+async def return_from_afk(message):
+    data = afk_registry.get(message.author.id)
+    if not data:
+        return
+    try:
+        await outbound.run(PRIORITY_COSMETIC, ('members', message.guild.id), message.author.edit, nick=data['original_nickname'])
+        await afk_registry.remove(message.author.id)
+        embed = discord.Embed(
+            title="✅ Welcome Back!",
+            description=f"{message.author.mention} is no longer AFK",
+            color=0x00ff00,
+            timestamp=datetime.datetime.now()
+        )
+        await message.channel.send(embed=embed)
+    except:
+        pass
+
+async def announce_afk_mentions(message):
+    for mention, data in afk_registry.mentioned(message.mentions):
+        end_time = datetime.datetime.fromisoformat(data['end_time'])
+        time_remaining = end_time - datetime.datetime.now()
+        if time_remaining.total_seconds() > 0:
+            embed = discord.Embed(
+                title="⏸️ User is AFK",
+                description=f"{mention.mention} is currently AFK",
+                color=0xffff00,
+                timestamp=datetime.datetime.now()
+            )
+            embed.add_field(name="Reason", value=data['reason'], inline=True)
+            embed.add_field(name="Time Remaining", value=f"<t:{int(end_time.timestamp())}:R>", inline=True)
+            embed.set_thumbnail(url=mention.display_avatar.url)
+            await message.channel.send(embed=embed, delete_after=10)
+
+# Stages run in order for every guild message; the route is picked by channel ID,
+# then by ticket category, then falls back to DEFAULT_STAGES.
+DEFAULT_STAGES = (return_from_afk, announce_afk_mentions, award_xp)
+AFK_EXCLUDED_STAGES = (announce_afk_mentions, award_xp)
+MESSAGE_ROUTES = {channel_id: AFK_EXCLUDED_STAGES for channel_id in AFK_EXCLUDED_CHANNELS}
+MESSAGE_ROUTES[EVIDENCE_CHANNEL_ID] = (collect_evidence,) + AFK_EXCLUDED_STAGES
+CATEGORY_ROUTES = {category_id: (touch_ticket_activity,) + DEFAULT_STAGES for category_id in TICKET_CATEGORY_IDS}
+
+def message_stages(channel):
+    stages = MESSAGE_ROUTES.get(channel.id)
+    if stages is None:
+        stages = CATEGORY_ROUTES.get(getattr(channel, 'category_id', None), DEFAULT_STAGES)
+    return stages
+
+@bot.event
+async def on_message(message):
+    if message.guild is not None and ticket_capture.is_ticket_channel(message.channel):
+        try:
+            await ticket_capture.capture(message)
+        except Exception as e:
+            print(f"Error capturing ticket message: {e}")
+    if message.author.bot:
+        return
+    if message.guild is not None:
+        for stage in message_stages(message.channel):
+            try:
+                await stage(message)
+            except Exception as e:
+                print(f"Error in {stage.__name__}: {e}")
     await bot.process_commands(message)
 
 @tasks.loop(minutes=10)
 async def check_echo_roles():
     await bot.wait_until_ready()
-    level_data = load_level_data()
-    for user_id, data in list(level_data.items()):
-        if data.get("level") == 50 and data.get("echo_time"):
-            try:
-                end_time = datetime.datetime.fromisoformat(data["echo_time"])
-                if datetime.datetime.now() >= end_time:
-                    for guild in bot.guilds:
-                        member = guild.get_member(int(user_id))
-                        if member:
-                            echo_role = guild.get_role(ECHO_ROLE_ID)
-                            if echo_role and echo_role in member.roles:
-                                await member.remove_roles(echo_role)
-                    data["echo_time"] = None
-            except:
-                pass
-    save_level_data(level_data)
+    for user_id, data in await storage.get_expired_echo_levels(datetime.datetime.now()):
+        try:
+            record = await xp_accumulator.get_record(user_id)
+            record["echo_time"] = None
+            xp_accumulator.mark_dirty(user_id)
+            for guild in bot.guilds:
+                member = guild.get_member(int(user_id))
+                if member:
+                    role_rewards.schedule(member)
+        except:
+            pass
 
 @bot.tree.command(name="whois", description="Get information about a user")
 @app_commands.describe(user="The user to get information about")
@@ -3019,9 +5149,7 @@ async def whois(interaction: discord.Interaction, user: discord.Member = None):
     if user is None:
         user = interaction.user
     
-    level_data = load_level_data()
-    user_id = str(user.id)
-    user_level_data = level_data.get(user_id, {"level": 1, "xp": 0})
+    user_level_data = await xp_accumulator.get_level(user.id) or {"level": 1, "xp": 0}
     
     embed = discord.Embed(
         title=f"User Information",
@@ -3058,4 +5186,5 @@ async def whois(interaction: discord.Interaction, user: discord.Member = None):
     
     await interaction.response.send_message(embed=embed)
 
-bot.run(TOKEN)  
\ No newline at end of file
+if __name__ == '__main__':
+    bot.run(TOKEN)  
\ No newline at end of file
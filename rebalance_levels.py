@@ -0,0 +1,104 @@
+"""
+Recompute every user's level under a new XP curve and report the level role changes.
+
+Each user's total XP is kept; only the level it maps to changes. The new curve is a
+Python file defining get_xp_needed(level), optionally scaled. Stop the bot before
+running with --apply, then put the new curve into get_xp_needed in main.py.
+
+Usage: python rebalance_levels.py [--curve new_curve.py] [--scale 1.0] [--apply] [--list]
+"""
+import argparse
+import asyncio
+import runpy
+
+import numpy as np
+
+from main import (
+    LEVEL_ROLES, MAX_LEVEL, build_xp_table, get_xp_needed, state_store, storage
+)
+
+
+def load_curve(path, scale):
+    xp_needed = runpy.run_path(path)['get_xp_needed'] if path else get_xp_needed
+    return lambda level: int(round(xp_needed(level) * scale))
+
+
+def role_tiers(levels):
+    """Index into the sorted LEVEL_ROLES milestones of each user's reward role, -1 for none."""
+    milestones = np.array(sorted(LEVEL_ROLES))
+    return np.searchsorted(milestones, levels, side='right') - 1
+
+
+def rebalance(records, new_curve):
+    user_ids = list(records)
+    levels = np.array([records[u]['level'] for u in user_ids], dtype=np.int64)
+    xp = np.array([records[u]['xp'] for u in user_ids], dtype=np.int64)
+
+    old_table = np.array(build_xp_table(get_xp_needed), dtype=np.int64)
+    new_table = np.array(build_xp_table(new_curve), dtype=np.int64)
+    totals = old_table[levels - 1] + xp
+    new_levels = np.minimum(np.searchsorted(new_table, totals, side='right'), MAX_LEVEL)
+    new_xp = totals - new_table[new_levels - 1]
+    return user_ids, levels, xp, new_levels, new_xp
+
+
+def role_name(tier):
+    return f"Level {sorted(LEVEL_ROLES)[tier]}" if tier >= 0 else "no level role"
+
+
+def print_diff(user_ids, levels, new_levels, show_users):
+    old_tiers = role_tiers(levels)
+    new_tiers = role_tiers(new_levels)
+    print(f"{len(user_ids)} users: {int((new_levels > levels).sum())} level up, "
+          f"{int((new_levels < levels).sum())} level down, {int((new_levels == levels).sum())} unchanged")
+
+    changed = np.nonzero(old_tiers != new_tiers)[0]
+    if not len(changed):
+        print("No level role changes")
+        return
+    print(f"{len(changed)} users change level role:")
+    pairs, counts = np.unique(np.stack([old_tiers[changed], new_tiers[changed]], axis=1), axis=0, return_counts=True)
+    for (old, new), count in zip(pairs, counts):
+        print(f"  {role_name(old):>14} -> {role_name(new):<14} {count}")
+    if show_users:
+        for i in changed:
+            print(f"  {user_ids[i]}: level {levels[i]} -> {new_levels[i]}, "
+                  f"{role_name(old_tiers[i])} -> {role_name(new_tiers[i])}")
+
+
+async def run(args):
+    await storage.open_levels()
+    try:
+        records = await storage.all_levels()
+        if not records:
+            print("No level data")
+            return
+        user_ids, levels, xp, new_levels, new_xp = rebalance(records, load_curve(args.curve, args.scale))
+        print_diff(user_ids, levels, new_levels, args.list)
+        if args.apply:
+            updated = {}
+            for i in np.nonzero((new_levels != levels) | (new_xp != xp))[0]:
+                record = dict(records[user_ids[i]])
+                record['level'] = int(new_levels[i])
+                record['xp'] = int(new_xp[i])
+                if record['level'] < MAX_LEVEL:
+                    record['echo_time'] = None
+                updated[user_ids[i]] = record
+            await storage.save_levels(updated)
+            await state_store.flush_async()
+            print(f"Saved {len(updated)} level records")
+    finally:
+        await storage.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--curve', help="Python file defining get_xp_needed(level); defaults to the current curve")
+    parser.add_argument('--scale', type=float, default=1.0, help="Multiply the new curve's per-level XP by this factor")
+    parser.add_argument('--apply', action='store_true', help="Write the recomputed levels back to storage")
+    parser.add_argument('--list', action='store_true', help="List every user whose level role changes")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == '__main__':
+    main()